@@ -0,0 +1,68 @@
+"""
+Precomputed attack tables for the board (8x8 list) representation. Every table is indexed by square = row * 8 + col
+and holds (row, col) tuples, so attack tests are a few table lookups on GameState.board instead of generating the
+opponent's moves. The bitboard backend has its own mask tables in Bitboard.py.
+"""
+
+from Chess import Bitboard
+
+
+def square_lists(deltas):
+    table = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        table.append(
+            tuple((r + dr, c + dc) for dr, dc in deltas if 0 <= r + dr < 8 and 0 <= c + dc < 8)
+        )
+    return tuple(table)
+
+
+def ray_lists(direction):
+    # squares along the direction, nearest first
+    table = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        ray = []
+        r, c = r + direction[0], c + direction[1]
+        while 0 <= r < 8 and 0 <= c < 8:
+            ray.append((r, c))
+            r, c = r + direction[0], c + direction[1]
+        table.append(tuple(ray))
+    return tuple(table)
+
+
+KNIGHT_SQUARES = square_lists(Bitboard.KNIGHT_DELTAS)
+KING_SQUARES = square_lists(Bitboard.KING_DELTAS)
+# squares a pawn of the given color must stand on to attack the square
+PAWN_ATTACKER_SQUARES = {
+    "w": square_lists(((1, -1), (1, 1))),
+    "b": square_lists(((-1, -1), (-1, 1))),
+}
+ROOK_RAYS = tuple(zip(*(ray_lists(d) for d in Bitboard.ROOK_DIRECTIONS)))  # ROOK_RAYS[sq] = 4 rays
+BISHOP_RAYS = tuple(zip(*(ray_lists(d) for d in Bitboard.BISHOP_DIRECTIONS)))
+
+
+def is_square_attacked(board, row, col, by_color):
+    sq = row * 8 + col
+    knight = by_color + "N"
+    for r, c in KNIGHT_SQUARES[sq]:
+        if board[r][c] == knight:
+            return True
+    pawn = by_color + "p"
+    for r, c in PAWN_ATTACKER_SQUARES[by_color][sq]:
+        if board[r][c] == pawn:
+            return True
+    king = by_color + "K"
+    for r, c in KING_SQUARES[sq]:
+        if board[r][c] == king:
+            return True
+    queen = by_color + "Q"
+    for rays, slider in ((ROOK_RAYS[sq], by_color + "R"), (BISHOP_RAYS[sq], by_color + "B")):
+        for ray in rays:
+            for r, c in ray:
+                piece = board[r][c]
+                if piece != "--":
+                    if piece == slider or piece == queen:
+                        return True
+                    break
+    return False
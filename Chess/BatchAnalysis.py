@@ -0,0 +1,171 @@
+"""
+Batch analysis of an EPD/FEN file on every core. Positions are streamed from the file in chunks to a
+ProcessPoolExecutor whose workers each keep one Searcher (and its transposition table) warm for their whole life.
+Every position becomes one JSON line with the best move, score, depth and nodes, written in input order or as soon
+as it is finished. Only a bounded number of chunks is in flight, so memory stays flat on files of any size.
+A line that is not a legal position gets an "error" instead and makes the exit status 1.
+
+    python -m Chess.BatchAnalysis positions.epd --output results.jsonl --time 0.5
+    python -m Chess.BatchAnalysis positions.epd --workers 4 --depth 4 --order completion
+"""
+
+import argparse
+import concurrent.futures
+import itertools
+import json
+import os
+import sys
+import time
+
+from Chess import Epd, Pgn, Profiler, Searcher, Tablebase
+
+ORDERS = ("input", "completion")
+
+worker_searcher = None  # the warm engine of a pool worker, built once by init_worker
+
+
+def init_worker(search_options, profile=False, tablebase_dir=None):
+    global worker_searcher
+    tablebase = Tablebase.Tablebase(tablebase_dir) if tablebase_dir else None  # memory-mapped, shared by the workers
+    worker_searcher = Searcher.Searcher(tablebase=tablebase, **search_options)
+    if profile:
+        Profiler.enable()
+
+
+def analyse_position(index, record, searcher, use_bitboards=True):
+    result = {"index": index, "fen": record.fen}
+    if "id" in record.operations:
+        result["id"] = " ".join(record.operations["id"])
+    try:
+        gs = record.game_state(use_bitboards=use_bitboards)
+    except ValueError as e:
+        result["error"] = str(e)
+        return result
+    search = searcher.search(gs)
+    move = search.best_move
+    result["best_move"] = move.get_chess_notation() if move is not None else None
+    result["san"] = Pgn.move_to_san(gs, move, gs.get_valid_moves()) if move else None
+    result["score"] = search.score
+    result["depth"] = search.depth
+    result["nodes"] = search.nodes
+    result["elapsed"] = round(search.elapsed, 4)
+    if "bm" in record.operations and move is not None:
+        result["solved"] = result["san"].rstrip("+#") in [bm.rstrip("+#!?") for bm in record.operations["bm"]]
+    return result
+
+
+def analyse_chunk(chunk):
+    # runs in a pool worker, returns the results and the profile of the chunk (None when not profiling)
+    results = [analyse_position(index, record, worker_searcher) for index, record in chunk]
+    if not Profiler.enabled():
+        return results, None
+    profile = Profiler.snapshot()
+    Profiler.reset()
+    return results, profile
+
+
+def chunked(records, chunk_size):
+    numbered = enumerate(records)
+    while True:
+        chunk = list(itertools.islice(numbered, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def analyse(records, workers=None, order="input", chunk_size=8, profile=None, tablebase_dir=None, **search_options):
+    # yields one result dict per record, search_options are passed on to every worker's Searcher
+    # profile is a dict the workers' Profiler snapshots are merged into, None to run them unprofiled
+    # tablebase_dir holds Chess.Tablebase tables the searches probe
+    if order not in ORDERS:
+        raise ValueError("order must be one of %s, not %r" % (ORDERS, order))
+    workers = workers or os.cpu_count() or 1
+    max_pending = workers * 4
+    chunks = chunked(records, chunk_size)
+    waiting = {}  # finished results held back until every earlier one is written (input order only)
+    next_index = 0
+    initargs = (search_options, profile is not None, tablebase_dir)
+    with concurrent.futures.ProcessPoolExecutor(workers, initializer=init_worker, initargs=initargs) as pool:
+        pending = set()
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max_pending:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                else:
+                    pending.add(pool.submit(analyse_chunk, chunk))
+            if not pending:
+                break
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                results, chunk_profile = future.result()
+                if chunk_profile is not None:
+                    Profiler.merge(profile, chunk_profile)
+                for result in results:
+                    if order == "completion":
+                        yield result
+                    else:
+                        waiting[result["index"]] = result
+            while next_index in waiting:
+                yield waiting.pop(next_index)
+                next_index += 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse every position of an EPD/FEN file on all cores.")
+    parser.add_argument("path")
+    parser.add_argument("--output", help="JSONL file for the results, standard output by default")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, one per core by default")
+    parser.add_argument("--order", choices=ORDERS, default="input")
+    parser.add_argument("--chunk-size", type=int, default=8, help="positions sent to a worker at a time")
+    parser.add_argument("--time", type=float, default=None, help="seconds per position")
+    parser.add_argument("--nodes", type=int, default=None, help="nodes per position")
+    parser.add_argument("--depth", type=int, default=None, help="maximum depth per position")
+    parser.add_argument("--tt-size", type=int, default=16, help="transposition table of every worker in MB")
+    parser.add_argument("--profile", action="store_true", help="print the time the workers spent in GameState")
+    parser.add_argument("--tablebases", help="directory of the KQK, KRK and KPK tables built by Chess.Tablebase")
+    args = parser.parse_args(argv)
+    if args.time is None and args.nodes is None and args.depth is None:
+        parser.error("give at least one of --time, --nodes and --depth")
+
+    search_options = {
+        "time_limit": args.time,
+        "node_limit": args.nodes,
+        "max_depth": args.depth or 64,
+        "tt_size_mb": args.tt_size,
+    }
+    output = open(args.output, "w") if args.output else sys.stdout
+    profile = {} if args.profile else None
+    positions = nodes = errors = 0
+    start = time.perf_counter()
+    try:
+        records = Epd.read_epd(args.path)
+        options = (args.workers, args.order, args.chunk_size, profile, args.tablebases)
+        for result in analyse(records, *options, **search_options):
+            output.write(json.dumps(result) + "\n")
+            positions += 1
+            nodes += result.get("nodes", 0)
+            errors += "error" in result
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - start
+    print(
+        "%d positions (%d invalid) in %.3fs, %.1f positions/s, %d nodes/s"
+        % (
+            positions,
+            errors,
+            elapsed,
+            positions / elapsed if elapsed > 0 else 0,
+            nodes / elapsed if elapsed > 0 else 0,
+        ),
+        file=sys.stderr,
+    )
+    if profile is not None:
+        Profiler.summary(profile)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+The static evaluation of Evaluation for many positions at once with NumPy, for batch analysis and tuning. Positions
+are boards of 64 piece codes (0 for an empty square, 1-12 for Bitboard.PIECES), one row per position in the square
+order of GameState.board, and evaluate_boards() scores a whole array of them with one table lookup and one sum.
+Boards are built from GameStates with encode_game_states() or straight from FEN strings with encode_fens(), which
+never builds a GameState.
+
+    python -m Chess.BatchEvaluation positions.epd
+    python -m Chess.BatchEvaluation positions.epd --output scores.npy
+"""
+
+import argparse
+import itertools
+import sys
+import time
+
+import numpy as np
+
+from Chess import Bitboard, ChessEngine, Epd, Evaluation
+
+PIECE_CODES = {"--": 0}
+PIECE_CODES.update((piece, code) for code, piece in enumerate(Bitboard.PIECES, 1))
+# score of every piece code on every square, for white
+SCORE_TABLE = np.array([Evaluation.SQUARE_SCORES[piece] for piece in PIECE_CODES], np.int32)
+SQUARES = np.arange(64)
+# piece codes of a FEN rank or of a GameState.board row as 8 bytes, so boards are joined bytes and never built square
+# by square; both grow with every rank seen, like ChessEngine.FEN_RANKS
+RANK_BYTES = {}
+ROW_BYTES = {}
+CHUNK_SIZE = 65536
+
+
+def rank_bytes(rank):
+    codes = RANK_BYTES.get(rank)
+    if codes is None:
+        codes = bytes(PIECE_CODES[piece] for piece in ChessEngine.parse_fen_rank(rank))
+        if len(RANK_BYTES) >= ChessEngine.FEN_RANKS_MAX_SIZE:
+            RANK_BYTES.clear()
+        RANK_BYTES[rank] = codes
+    return codes
+
+
+def row_bytes(row):
+    key = tuple(row)
+    codes = ROW_BYTES.get(key)
+    if codes is None:
+        codes = bytes(PIECE_CODES[piece] for piece in key)
+        if len(ROW_BYTES) >= ChessEngine.FEN_RANKS_MAX_SIZE:
+            ROW_BYTES.clear()
+        ROW_BYTES[key] = codes
+    return codes
+
+
+def encode_game_states(game_states):
+    # (boards, white_to_move) arrays of the GameStates
+    boards = []
+    white_to_move = []
+    for gs in game_states:
+        boards.append(b"".join([row_bytes(row) for row in gs.board]))
+        white_to_move.append(gs.white_to_move)
+    return np.frombuffer(bytearray(b"".join(boards)), np.int8).reshape(-1, 64), np.array(white_to_move, np.bool_)
+
+
+def encode_fens(fens):
+    # (boards, white_to_move) arrays of FEN (or EPD) strings, raises ValueError on a malformed placement
+    boards = []
+    white_to_move = []
+    for fen in fens:
+        fields = fen.split(None, 2)
+        ranks = fields[0].split("/")
+        if len(ranks) != 8:
+            raise ValueError("FEN placement does not have 8 ranks: %r" % fen)
+        boards.append(b"".join([rank_bytes(rank) for rank in ranks]))
+        white_to_move.append(len(fields) < 2 or fields[1] == "w")
+    return np.frombuffer(bytearray(b"".join(boards)), np.int8).reshape(-1, 64), np.array(white_to_move, np.bool_)
+
+
+def evaluate_boards(boards, white_to_move=None):
+    # int32 scores of an (n, 64) array of boards, for white or for the side to move when white_to_move is given
+    boards = np.asarray(boards)
+    scores = np.empty(len(boards), np.int32)
+    for start in range(0, len(boards), CHUNK_SIZE):
+        chunk = boards[start:start + CHUNK_SIZE]
+        scores[start:start + len(chunk)] = SCORE_TABLE[chunk, SQUARES].sum(axis=1)
+    if white_to_move is not None:
+        scores = np.where(white_to_move, scores, -scores)
+    return scores
+
+
+def evaluate_game_states(game_states):
+    # the same as [Evaluation.evaluate(gs) for gs in game_states]
+    return evaluate_boards(*encode_game_states(game_states))
+
+
+def evaluate_fens(fens):
+    return evaluate_boards(*encode_fens(fens))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate every position of an EPD/FEN file at once.")
+    parser.add_argument("path")
+    parser.add_argument("--output", help="save the scores (side to move) to this .npy file instead of printing them")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    records = Epd.read_epd(args.path)
+    scores = []
+    while True:
+        fens = [record.fen for record in itertools.islice(records, CHUNK_SIZE)]
+        if not fens:
+            break
+        scores.append(evaluate_fens(fens))
+    scores = np.concatenate(scores) if scores else np.empty(0, np.int32)
+    elapsed = time.perf_counter() - start
+    if args.output:
+        np.save(args.output, scores)
+    else:
+        np.savetxt(sys.stdout, scores, fmt="%d")
+    print(
+        "%d positions in %.3fs, %d positions/s"
+        % (len(scores), elapsed, len(scores) / elapsed if elapsed > 0 else 0),
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
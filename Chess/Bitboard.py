@@ -0,0 +1,252 @@
+"""
+Bitboard representation of a chess position. Every piece type of every color is kept in one 64-bit integer, plus
+occupancy masks for each color. Square index is row * 8 + col, so bit 0 is a8 and bit 63 is h1 (same orientation
+as GameState.board). This module also holds the precomputed attack tables used by the bitboard move generator.
+"""
+
+PIECES = ("wp", "wR", "wN", "wB", "wQ", "wK", "bp", "bR", "bN", "bB", "bQ", "bK")
+FULL = (1 << 64) - 1
+FILE_A = 0x0101010101010101
+FILE_H = FILE_A << 7
+NOT_FILE_A = FULL ^ FILE_A
+NOT_FILE_H = FULL ^ FILE_H
+RANK_8 = 0xFF  # row 0
+RANK_1 = 0xFF << 56  # row 7
+RANK_3 = 0xFF << 40  # row 5, white pawns landing here after a single push may push again
+RANK_6 = 0xFF << 16  # row 2, same for black
+
+# (row delta, col delta) for every sliding direction, and whether stepping in it increases the square index
+ROOK_DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+POSITIVE = tuple(d[0] * 8 + d[1] > 0 for d in DIRECTIONS)
+KNIGHT_DELTAS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+KING_DELTAS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+SQUARES = tuple(divmod(sq, 8) for sq in range(64))  # square index -> (row, col)
+
+
+def square_index(row, col):
+    return row * 8 + col
+
+
+def iter_bits(bb):
+    # yields the square index of every set bit, lowest first
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def leaper_attacks(deltas):
+    table = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        bb = 0
+        for dr, dc in deltas:
+            if 0 <= r + dr < 8 and 0 <= c + dc < 8:
+                bb |= 1 << square_index(r + dr, c + dc)
+        table.append(bb)
+    return tuple(table)
+
+
+def ray_attacks(direction):
+    table = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        bb = 0
+        r, c = r + direction[0], c + direction[1]
+        while 0 <= r < 8 and 0 <= c < 8:
+            bb |= 1 << square_index(r, c)
+            r, c = r + direction[0], c + direction[1]
+        table.append(bb)
+    return tuple(table)
+
+
+KNIGHT_ATTACKS = leaper_attacks(KNIGHT_DELTAS)
+KING_ATTACKS = leaper_attacks(KING_DELTAS)
+# squares attacked by a pawn of the given color standing on the square
+PAWN_ATTACKS = {
+    "w": leaper_attacks(((-1, -1), (-1, 1))),
+    "b": leaper_attacks(((1, -1), (1, 1))),
+}
+RAYS = tuple(ray_attacks(d) for d in DIRECTIONS)
+
+
+def between_squares():
+    # BETWEEN[a][b] is the set of squares strictly between a and b if they share a line, otherwise 0
+    table = [[0] * 64 for _ in range(64)]
+    for d in range(8):
+        for a in range(64):
+            ray = RAYS[d][a]
+            for b in iter_bits(ray):
+                table[a][b] = ray ^ RAYS[d][b] ^ (1 << b)
+    return tuple(tuple(row) for row in table)
+
+
+BETWEEN = between_squares()
+
+
+def slider_attacks(sq, occupied, directions):
+    # directions are indexes into DIRECTIONS; the ray is cut at the first blocker, which is included
+    attacks = 0
+    for d in directions:
+        ray = RAYS[d][sq]
+        blockers = ray & occupied
+        if blockers:
+            if POSITIVE[d]:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= RAYS[d][first]
+        attacks |= ray
+    return attacks
+
+
+ROOK_DIRECTION_INDEXES = (0, 1, 2, 3)
+BISHOP_DIRECTION_INDEXES = (4, 5, 6, 7)
+# every square a rook or a bishop on the square could reach on an empty board
+ROOK_LINES = tuple(RAYS[0][sq] | RAYS[1][sq] | RAYS[2][sq] | RAYS[3][sq] for sq in range(64))
+BISHOP_LINES = tuple(RAYS[4][sq] | RAYS[5][sq] | RAYS[6][sq] | RAYS[7][sq] for sq in range(64))
+
+
+def relevant_mask(sq, directions):
+    # the squares whose occupancy can cut a ray from sq: every ray without its last square on the edge
+    mask = 0
+    for d in directions:
+        ray = RAYS[d][sq]
+        if ray:
+            last = ray.bit_length() - 1 if POSITIVE[d] else (ray & -ray).bit_length() - 1
+            mask |= ray ^ (1 << last)
+    return mask
+
+
+# slider attacks per square, keyed by the occupancy of the relevant squares and filled the first time a key is seen,
+# so a lookup is a mask and a dict get instead of a walk along four rays (at most 4096 keys per rook square)
+ROOK_MASKS = tuple(relevant_mask(sq, ROOK_DIRECTION_INDEXES) for sq in range(64))
+BISHOP_MASKS = tuple(relevant_mask(sq, BISHOP_DIRECTION_INDEXES) for sq in range(64))
+ROOK_TABLES = tuple({} for _ in range(64))
+BISHOP_TABLES = tuple({} for _ in range(64))
+
+
+def rook_attacks(sq, occupied):
+    key = occupied & ROOK_MASKS[sq]
+    attacks = ROOK_TABLES[sq].get(key)
+    if attacks is None:
+        attacks = ROOK_TABLES[sq][key] = slider_attacks(sq, key, ROOK_DIRECTION_INDEXES)
+    return attacks
+
+
+def bishop_attacks(sq, occupied):
+    key = occupied & BISHOP_MASKS[sq]
+    attacks = BISHOP_TABLES[sq].get(key)
+    if attacks is None:
+        attacks = BISHOP_TABLES[sq][key] = slider_attacks(sq, key, BISHOP_DIRECTION_INDEXES)
+    return attacks
+
+
+class Bitboards:
+    def __init__(self, board):
+        pieces = {piece: 0 for piece in PIECES}
+        sq = 0
+        for row in board:
+            for piece in row:
+                if piece != "--":
+                    pieces[piece] |= 1 << sq
+                sq += 1
+        self.pieces = pieces
+        self.occupancy = {"w": 0, "b": 0}
+        for piece, bits in pieces.items():
+            self.occupancy[piece[0]] |= bits
+        self.occupied = self.occupancy["w"] | self.occupancy["b"]
+
+    def add_piece(self, piece, sq):
+        bit = 1 << sq
+        self.pieces[piece] |= bit
+        self.occupancy[piece[0]] |= bit
+        self.occupied |= bit
+
+    def remove_piece(self, piece, sq):
+        mask = ~(1 << sq)
+        self.pieces[piece] &= mask
+        self.occupancy[piece[0]] &= mask
+        self.occupied &= mask
+
+    def make_move(self, move, piece_placed):
+        # piece_placed is the piece that ended up on the end square (differs from piece_moved on promotion)
+        start = move.packed & 63  # the packed move already holds square indexes
+        end = (move.packed >> 6) & 63
+        self.remove_piece(move.piece_moved, start)
+        if move.enpassant_move:
+            self.remove_piece(move.piece_captured, (start & ~7) | (end & 7))
+        elif move.piece_captured != "--":
+            self.remove_piece(move.piece_captured, end)
+        self.add_piece(piece_placed, end)
+        if move.castle:
+            rook = move.piece_moved[0] + "R"
+            if end > start:  # king side castle
+                self.remove_piece(rook, end + 1)
+                self.add_piece(rook, end - 1)
+            else:  # queen side castle
+                self.remove_piece(rook, end - 2)
+                self.add_piece(rook, end + 1)
+
+    def undo_move(self, move, piece_placed):
+        start = move.packed & 63
+        end = (move.packed >> 6) & 63
+        self.remove_piece(piece_placed, end)
+        if move.enpassant_move:
+            self.add_piece(move.piece_captured, (start & ~7) | (end & 7))
+        elif move.piece_captured != "--":
+            self.add_piece(move.piece_captured, end)
+        self.add_piece(move.piece_moved, start)
+        if move.castle:
+            rook = move.piece_moved[0] + "R"
+            if end > start:  # king side castle
+                self.remove_piece(rook, end - 1)
+                self.add_piece(rook, end + 1)
+            else:  # queen side castle
+                self.remove_piece(rook, end + 1)
+                self.add_piece(rook, end - 2)
+
+    def attackers_to(self, sq, by_color, occupied):
+        pieces = self.pieces
+        other = "b" if by_color == "w" else "w"
+        queens = pieces[by_color + "Q"]
+        return (
+            (PAWN_ATTACKS[other][sq] & pieces[by_color + "p"])
+            | (KNIGHT_ATTACKS[sq] & pieces[by_color + "N"])
+            | (KING_ATTACKS[sq] & pieces[by_color + "K"])
+            | (rook_attacks(sq, occupied) & (pieces[by_color + "R"] | queens))
+            | (bishop_attacks(sq, occupied) & (pieces[by_color + "B"] | queens))
+        )
+
+    def is_square_attacked(self, sq, by_color):
+        return self.attackers_to(sq, by_color, self.occupied) != 0
+
+    def attack_map(self, by_color, occupied):
+        # every square attacked by the given color, with sliders looking through the given occupancy
+        pieces = self.pieces
+        pawns = pieces[by_color + "p"]
+        if by_color == "w":
+            attacks = ((pawns & NOT_FILE_A) >> 9) | ((pawns & NOT_FILE_H) >> 7)
+        else:
+            attacks = ((pawns & NOT_FILE_H) << 9) | ((pawns & NOT_FILE_A) << 7)
+        # the bit loops are written out, this runs once for every position the generator sees
+        knights = pieces[by_color + "N"]
+        while knights:
+            low = knights & -knights
+            knights ^= low
+            attacks |= KNIGHT_ATTACKS[low.bit_length() - 1]
+        queens = pieces[by_color + "Q"]
+        sliders = pieces[by_color + "R"] | queens
+        while sliders:
+            low = sliders & -sliders
+            sliders ^= low
+            attacks |= rook_attacks(low.bit_length() - 1, occupied)
+        sliders = pieces[by_color + "B"] | queens
+        while sliders:
+            low = sliders & -sliders
+            sliders ^= low
+            attacks |= bishop_attacks(low.bit_length() - 1, occupied)
+        attacks |= KING_ATTACKS[pieces[by_color + "K"].bit_length() - 1]
+        return attacks & FULL
@@ -3,9 +3,45 @@ This class is responsible for storing all the information about the current stat
 responsible for determining the valid moves at current state. It will also keep a move log
 """
 
+from Chess import AttackTables, Bitboard, Evaluation, Zobrist
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+FEN_PIECES = {
+    "P": "wp", "N": "wN", "B": "wB", "R": "wR", "Q": "wQ", "K": "wK",
+    "p": "bp", "n": "bN", "b": "bB", "r": "bR", "q": "bQ", "k": "bK",
+}
+FEN_SYMBOLS = {piece: symbol for symbol, piece in FEN_PIECES.items()}
+# stages of GameState.get_move_stages, in the order they are generated
+HASH_MOVE = "hash_move"
+CAPTURES = "captures"  # including en passant and promotions that capture
+PROMOTIONS = "promotions"  # the remaining, non capturing promotions
+QUIETS = "quiets"  # everything else, castling included
+# parsed FEN ranks, positions from the same file share most of them so parsing becomes a dict lookup per rank
+FEN_RANKS = {}
+FEN_RANKS_MAX_SIZE = 1 << 16
+
+
+def parse_fen_rank(rank):
+    squares = FEN_RANKS.get(rank)
+    if squares is None:
+        row = []
+        for char in rank:
+            if char in "12345678":
+                row.extend(["--"] * int(char))
+            elif char in FEN_PIECES:
+                row.append(FEN_PIECES[char])
+            else:
+                raise ValueError("invalid character %r in FEN rank %r" % (char, rank))
+        if len(row) != 8:
+            raise ValueError("FEN rank %r does not have 8 squares" % rank)
+        if len(FEN_RANKS) >= FEN_RANKS_MAX_SIZE:
+            FEN_RANKS.clear()
+        squares = FEN_RANKS[rank] = tuple(row)
+    return squares
+
 
 class GameState:
-    def __init__(self):
+    def __init__(self, use_bitboards=False, debug=False, move_cache=None, _start_position=True):
         # board is an 8x8 2d list, each element of the list has 2 characters,
         # The first character represents the color of the piece, 'b' or 'w'
         # The second character represents the type of piece
@@ -36,9 +72,13 @@ class GameState:
         self.stalemate = False
 
         self.in_check = False
-        self.pins = []
-        self.checks = []
+        # set by check_for_pins_and_checks for the side to move:
+        # pin_directions[row * 8 + col] is the direction from the king to the pinned piece on that square, or ()
+        # check_mask has a bit for every square a non-king move may land on (all of them when not in check)
+        self.pin_directions = [()] * 64
+        self.check_mask = Bitboard.FULL
         self.enpassant_possible = ()  # coordinates for the square there en passant capture is possible
+        self.enpassant_possible_log = [self.enpassant_possible]
         self.current_castling_right = CastleRights(True, True, True, True)
         self.castle_rights_log = [
             CastleRights(
@@ -48,51 +88,185 @@ class GameState:
                 self.current_castling_right.bqs,
             )
         ]
+        # optional bitboard mirror of self.board, chosen here and kept in sync by make_move/undo_move;
+        # _start_position=False leaves it, the key and the score to from_fen, which sets them up once for its board
+        self.bitboards = Bitboard.Bitboards(self.board) if use_bitboards and _start_position else None
+        # 64-bit Zobrist key of the position, updated incrementally by make_move/undo_move
+        self.zobrist_key = Zobrist.compute_key(self) if _start_position else 0
+        # material and piece-square score for white, updated incrementally the same way
+        self.evaluation = Evaluation.compute_score(self) if _start_position else 0
+        # debug mode checks the incremental key and score against a full recomputation after every move
+        self.debug = debug
+        # optional MoveCache shared by get_valid_moves, which then returns cached tuples
+        self.move_cache = move_cache
+        # halfmove clock and fullmove number of the starting position, to_fen counts the move log on top of them
+        self.fen_clocks = (0, 1)
+
+    @classmethod
+    def from_fen(cls, fen, use_bitboards=False, debug=False, move_cache=None):
+        # the halfmove clock and fullmove number are optional, so the first four fields of an EPD line work too
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError("FEN needs at least 4 fields: %r" % fen)
+        ranks = fields[0].split("/")
+        if len(ranks) != 8:
+            raise ValueError("FEN placement does not have 8 ranks: %r" % fen)
+        gs = cls(debug=debug, move_cache=move_cache, _start_position=False)
+        gs.board = [list(parse_fen_rank(rank)) for rank in ranks]
+
+        if fields[1] not in ("w", "b"):
+            raise ValueError("invalid side to move %r in FEN %r" % (fields[1], fen))
+        gs.white_to_move = fields[1] == "w"
+        castling = fields[2]
+        if castling != "-" and (not castling or castling.strip("KQkq")):
+            raise ValueError("invalid castling rights %r in FEN %r" % (castling, fen))
+        # a right is only kept while the king and the rook are on their home squares, make_move relies on it
+        board = gs.board
+        white_home = board[7][4] == "wK"
+        black_home = board[0][4] == "bK"
+        rights = (
+            "K" in castling and white_home and board[7][7] == "wR",
+            "k" in castling and black_home and board[0][7] == "bR",
+            "Q" in castling and white_home and board[7][0] == "wR",
+            "q" in castling and black_home and board[0][0] == "bR",
+        )
+        gs.current_castling_right = CastleRights(*rights)
+        gs.castle_rights_log = [CastleRights(*rights)]
+        enpassant = fields[3]
+        if enpassant != "-":
+            if (
+                len(enpassant) != 2
+                or enpassant[0] not in Move.files_to_cols
+                or enpassant[1] != ("6" if gs.white_to_move else "3")
+            ):
+                raise ValueError("invalid en passant square %r in FEN %r" % (enpassant, fen))
+            row, col = Move.ranks_to_rows[enpassant[1]], Move.files_to_cols[enpassant[0]]
+            # the pawn that just made the double push stands right in front of the square
+            pawn_row, pawn = (row + 1, "bp") if gs.white_to_move else (row - 1, "wp")
+            if board[row][col] != "--" or board[pawn_row][col] != pawn:
+                raise ValueError("no pawn to take en passant on %r in FEN %r" % (enpassant, fen))
+            gs.enpassant_possible = (row, col)
+        gs.enpassant_possible_log = [gs.enpassant_possible]
+        if len(fields) >= 6:
+            try:
+                gs.fen_clocks = (int(fields[4]), int(fields[5]))
+            except ValueError:
+                raise ValueError("invalid move counters in FEN %r" % fen) from None
+
+        # the move generators expect one king of each color and no pawn on the first or eighth rank
+        kings = {"wK": [], "bK": []}
+        for r, row in enumerate(board):
+            for king, squares in kings.items():
+                if king in row:
+                    squares.extend((r, c) for c, piece in enumerate(row) if piece == king)
+        if len(kings["wK"]) != 1 or len(kings["bK"]) != 1:
+            raise ValueError("FEN needs exactly one king of each color: %r" % fen)
+        gs.white_king_location = kings["wK"][0]
+        gs.black_king_location = kings["bK"][0]
+        if any(pawn in board[r] for r in (0, 7) for pawn in ("wp", "bp")):
+            raise ValueError("FEN has a pawn on the first or eighth rank: %r" % fen)
+        if use_bitboards:
+            gs.bitboards = Bitboard.Bitboards(gs.board)
+        # the side that just moved may not be in check, the search would capture the king
+        waiting_king = gs.black_king_location if gs.white_to_move else gs.white_king_location
+        if gs.is_square_attacked(waiting_king, gs.get_ally_color()):
+            raise ValueError("the side not to move is in check in FEN %r" % fen)
+        gs.zobrist_key = Zobrist.compute_key(gs)
+        gs.evaluation = Evaluation.compute_score(gs)
+        return gs
+
+    def to_fen(self):
+        ranks = []
+        for row in self.board:
+            rank = ""
+            empty = 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += FEN_SYMBOLS[piece]
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+        castle_rights = self.current_castling_right
+        castling = (
+            ("K" if castle_rights.wks else "")
+            + ("Q" if castle_rights.wqs else "")
+            + ("k" if castle_rights.bks else "")
+            + ("q" if castle_rights.bqs else "")
+        ) or "-"
+        if self.enpassant_possible:
+            enpassant = Move.cols_to_files[self.enpassant_possible[1]] + Move.rows_to_ranks[self.enpassant_possible[0]]
+        else:
+            enpassant = "-"
+        # the halfmove clock restarts with every pawn move and capture
+        halfmove_clock, fullmove_number = self.fen_clocks
+        plies = len(self.move_log)
+        for i, move in enumerate(reversed(self.move_log)):
+            if move.piece_moved[1] == "p" or move.piece_captured != "--":
+                halfmove_clock = i
+                break
+        else:
+            halfmove_clock += plies
+        started_white = self.white_to_move == (plies % 2 == 0)
+        fullmove_number += (plies if started_white else plies + 1) // 2
+        return "%s %s %s %s %d %d" % (
+            "/".join(ranks),
+            "w" if self.white_to_move else "b",
+            castling,
+            enpassant,
+            halfmove_clock,
+            fullmove_number,
+        )
 
     def make_move(self, move):
-        self.board[move.start_row][move.start_col] = "--"
-        self.board[move.end_row][move.end_col] = move.piece_moved
+        start_row, start_col, end_row, end_col = move.start_row, move.start_col, move.end_row, move.end_col
+        previous_state_key = Zobrist.state_key(self.current_castling_right, self.enpassant_possible)
+        self.board[start_row][start_col] = "--"
+        self.board[end_row][end_col] = move.piece_moved
         self.move_log.append(move)
         self.white_to_move = not self.white_to_move
         # update king's location if moved
         if move.piece_moved == "wK":
-            self.white_king_location = (move.end_row, move.end_col)
+            self.white_king_location = (end_row, end_col)
         elif move.piece_moved == "bK":
-            self.black_king_location = (move.end_row, move.end_col)
+            self.black_king_location = (end_row, end_col)
 
         # if pawn moves twice, next move can capture en passant
-        if move.piece_moved[1] == "p" and abs(move.start_row - move.end_row) == 2:
+        if move.piece_moved[1] == "p" and abs(start_row - end_row) == 2:
             self.enpassant_possible = (
-                (move.start_row + move.end_row) // 2,
-                move.end_col,
+                (start_row + end_row) // 2,
+                end_col,
             )
         else:
             self.enpassant_possible = ()
         # if en passant move, must update the board to capture the pawn
         if move.enpassant_move:
-            self.board[move.start_row][move.end_col] = "--"  # capturing pawn
+            self.board[start_row][end_col] = "--"  # capturing pawn
         # if pawn promotion
         if move.pawn_promotion:
-            promoted_piece = input(
-                "Promote to Q, R, B or N: "
-            )  # we can take this part to the ui later
-            self.board[move.end_row][move.end_col] = (
-                move.piece_moved[0] + promoted_piece
-            )
+            self.board[end_row][end_col] = move.piece_moved[0] + move.promotion_piece
         # castle move
         if move.castle:
-            if move.end_col - move.start_col == 2:  # king side castle
+            if end_col - start_col == 2:  # king side castle
                 # moves the rock
-                self.board[move.end_row][move.end_col - 1] = self.board[move.end_row][
-                    move.end_col + 1
+                self.board[end_row][end_col - 1] = self.board[end_row][
+                    end_col + 1
                 ]
-                self.board[move.end_row][move.end_col + 1] = "--"
+                self.board[end_row][end_col + 1] = "--"
             else:  # queen side castle
                 # moves the rock
-                self.board[move.end_row][move.end_col + 1] = self.board[move.end_row][
-                    move.end_col - 2
+                self.board[end_row][end_col + 1] = self.board[end_row][
+                    end_col - 2
                 ]
-                self.board[move.end_row][move.end_col - 2] = "--"
+                self.board[end_row][end_col - 2] = "--"
+        if self.bitboards is not None:
+            self.bitboards.make_move(move, self.board[end_row][end_col])
+
+        self.enpassant_possible_log.append(self.enpassant_possible)
 
         # update castling rights
         self.update_castle_rights(move)
@@ -104,46 +278,73 @@ class GameState:
                 self.current_castling_right.bqs,
             )
         )
+        self.zobrist_key ^= (
+            Zobrist.move_key(move, self.board[end_row][end_col])
+            ^ previous_state_key
+            ^ Zobrist.state_key(self.current_castling_right, self.enpassant_possible)
+            ^ Zobrist.WHITE_TO_MOVE
+        )
+        self.evaluation += Evaluation.move_delta(move, self.board[end_row][end_col])
+        if self.debug:
+            assert self.zobrist_key == Zobrist.compute_key(self), "zobrist key out of sync after make_move"
+            assert self.evaluation == Evaluation.compute_score(self), "evaluation out of sync after make_move"
 
     def undo_move(self):
         if self.move_log:
             move = self.move_log.pop()
-            self.board[move.start_row][move.start_col] = move.piece_moved
-            self.board[move.end_row][move.end_col] = move.piece_captured
+            start_row, start_col, end_row, end_col = move.start_row, move.start_col, move.end_row, move.end_col
+            piece_placed = self.board[end_row][end_col]  # differs from piece_moved after a promotion
+            previous_state_key = Zobrist.state_key(self.current_castling_right, self.enpassant_possible)
+            self.zobrist_key ^= Zobrist.move_key(move, piece_placed)
+            self.evaluation -= Evaluation.move_delta(move, piece_placed)
+            if self.bitboards is not None:
+                self.bitboards.undo_move(move, piece_placed)
+            self.board[start_row][start_col] = move.piece_moved
+            self.board[end_row][end_col] = move.piece_captured
             self.white_to_move = not self.white_to_move
             # update king's location if moved
             if move.piece_moved == "wK":
-                self.white_king_location = (move.start_row, move.start_col)
+                self.white_king_location = (start_row, start_col)
             elif move.piece_moved == "bK":
-                self.black_king_location = (move.start_row, move.start_col)
+                self.black_king_location = (start_row, start_col)
 
             # undo en passant move
             if move.enpassant_move:
-                self.board[move.end_row][
-                    move.end_col
+                self.board[end_row][
+                    end_col
                 ] = "--"  # leave landing square blank
-                self.board[move.start_row][move.start_col] = move.piece_captured
-                self.enpassant_possible = (move.end_row, move.end_col)
+                self.board[start_row][end_col] = move.piece_captured
 
-            # undo a 2 square paw advance
-            if move.piece_moved[1] == "p" and abs(move.start_row - move.end_row) == 2:
-                self.enpassant_possible = ()
+            # restore the en passant square of the previous position
+            self.enpassant_possible_log.pop()
+            self.enpassant_possible = self.enpassant_possible_log[-1]
             # undo castling rights
             self.castle_rights_log.pop()  # get rid of the new castle rights from the move we are undoing
-            # set the current castle rights to the last one in the list
-            self.current_castling_right = self.castle_rights_log[-1]
+            # set the current castle rights to a copy of the last one in the list, so the log entry stays untouched
+            castle_rights = self.castle_rights_log[-1]
+            self.current_castling_right = CastleRights(
+                castle_rights.wks, castle_rights.bks, castle_rights.wqs, castle_rights.bqs
+            )
             # undo castle move
             if move.castle:
-                if move.end_col - move.start_col == 2:  # king side castle
-                    self.board[move.end_row][move.end_col + 1] = self.board[
-                        move.end_row
-                    ][move.end_col - 1]
-                    self.board[move.end_row][move.end_col - 1] = "--"
+                if end_col - start_col == 2:  # king side castle
+                    self.board[end_row][end_col + 1] = self.board[
+                        end_row
+                    ][end_col - 1]
+                    self.board[end_row][end_col - 1] = "--"
                 else:  # queen side castle
-                    self.board[move.end_row][move.end_col - 2] = self.board[
-                        move.end_row
-                    ][move.end_col + 1]
-                    self.board[move.end_row][move.end_col + 1] = "--"
+                    self.board[end_row][end_col - 2] = self.board[
+                        end_row
+                    ][end_col + 1]
+                    self.board[end_row][end_col + 1] = "--"
+            self.zobrist_key ^= (
+                previous_state_key
+                ^ Zobrist.state_key(self.current_castling_right, self.enpassant_possible)
+                ^ Zobrist.WHITE_TO_MOVE
+            )
+            if self.debug:
+                assert self.zobrist_key == Zobrist.compute_key(self), "zobrist key out of sync after undo_move"
+                assert self.evaluation == Evaluation.compute_score(self), "evaluation out of sync after undo_move"
 
     def update_castle_rights(self, move):
         if move.piece_moved == "wK":
@@ -164,94 +365,388 @@ class GameState:
                     self.current_castling_right.bqs = False
                 elif move.start_col == 7:
                     self.current_castling_right.bks = False
+        # a rook captured on its starting square can't castle anymore either
+        if move.piece_captured == "wR":
+            if move.end_row == 7:
+                if move.end_col == 0:
+                    self.current_castling_right.wqs = False
+                elif move.end_col == 7:
+                    self.current_castling_right.wks = False
+        elif move.piece_captured == "bR":
+            if move.end_row == 0:
+                if move.end_col == 0:
+                    self.current_castling_right.bqs = False
+                elif move.end_col == 7:
+                    self.current_castling_right.bks = False
 
     def get_valid_moves(self):
+        if self.move_cache is not None:
+            return self.move_cache.get_valid_moves(self)
+        return self.generate_valid_moves()
+
+    def generate_valid_moves(self):
+        if self.bitboards is not None:
+            return self.get_bitboard_valid_moves()
         moves = []
-        self.in_check, self.pins, self.checks = self.check_for_pins_and_checks()
+        self.in_check, self.pin_directions, self.check_mask = self.check_for_pins_and_checks()
         if self.white_to_move:
             king_row, king_col = self.white_king_location
         else:
             king_row, king_col = self.black_king_location
-        if self.in_check:
-            if len(self.checks) == 1:  # only 1 check, block check or move king
-                moves = self.get_all_possible_moves()
-                if self.white_to_move:
-                    self.get_castle_moves(
-                        self.white_king_location[0], self.white_king_location[1], moves
-                    )
-                else:
-                    self.get_castle_moves(
-                        self.black_king_location[0], self.black_king_location[1], moves
-                    )
-
-                # to block a check you must move a piece into tne of the squares between the enemy piece and king
-                check = self.checks[0]
-                check_row = check[0]
-                check_col = check[1]
-                piece_checking = self.board[check_row][
-                    check_col
-                ]  # enemy piece causing the check
-                valid_squares = []  # squares that pieces can move to
-                # if knight, must capture or move king, other pieces can be blocked
-                if piece_checking[1] == "N":
-                    valid_squares = [(check_row, check_col)]
-                else:
-                    for i in range(1, 8):
-                        valid_square = (
-                            king_row + check[2] * i,
-                            king_col + check[3] * i,
-                        )  # check[2] and check[3] are the check directions
-                        valid_squares.append(valid_square)
-                        if (
-                            valid_square[0] == check_row
-                            and valid_square[1] == check_col
-                        ):  # once you get to piece end checks
-                            break
-                # get rid of any moves that don't block check or move king
-                for i in range(len(moves) - 1, -1, -1):
-                    if (
-                        moves[i].piece_moved[1] != "K"
-                    ):  # move doesn't move king so it must block or capture
-                        if (
-                            not (moves[i].end_row, moves[i].end_col) in valid_squares
-                        ):  # move doesn't block check or capture
-                            moves.remove(moves[i])
-            else:  # double check, king has to move
-                self.get_king_moves(king_row, king_col, moves)
-                if self.white_to_move:
-                    self.get_castle_moves(
-                        self.white_king_location[0], self.white_king_location[1], moves
-                    )
-                else:
-                    self.get_castle_moves(
-                        self.black_king_location[0], self.black_king_location[1], moves
-                    )
-        else:  # not in check so all moves are fine
+        if self.check_mask:
+            # the piece generators only emit moves that respect pins and block or capture a checking piece
             moves = self.get_all_possible_moves()
-            if self.white_to_move:
-                self.get_castle_moves(
-                    self.white_king_location[0], self.white_king_location[1], moves
-                )
-            else:
-                self.get_castle_moves(
-                    self.black_king_location[0], self.black_king_location[1], moves
-                )
+        else:  # double check, king has to move
+            self.get_king_moves(king_row, king_col, moves)
+        self.get_castle_moves(king_row, king_col, moves)
 
         if len(moves) == 0:
             if self.in_check:
                 self.checkmate = True
             else:
-                self.checkmate = True
+                self.stalemate = True
         else:
             self.checkmate = False
+            self.stalemate = False
+
+        return moves
+
+    def get_move_stages(self, hash_move=0):
+        # yields (stage, moves) for the hash move (a packed move, 0 for none, only yielded when legal), captures,
+        # promotions and quiet moves, each list generated when the consumer asks for it, so stopping after the
+        # promotions never pays for the quiet moves. Together they hold exactly the moves of get_valid_moves and the
+        # consumer may make and undo moves in between. in_check is set on the first step, checkmate/stalemate once
+        # the last stage is reached
+        self.checkmate = False
+        self.stalemate = False
+        if self.bitboards is None:
+            # the board walk has no target masks, its moves are generated at once and handed out by stage
+            moves = self.generate_valid_moves()
+            stages = {HASH_MOVE: [], CAPTURES: [], PROMOTIONS: [], QUIETS: []}
+            for move in moves:
+                if hash_move and move.packed & Move.ID_MASK == hash_move & Move.ID_MASK:
+                    stages[HASH_MOVE].append(move)
+                elif move.piece_captured != "--":
+                    stages[CAPTURES].append(move)
+                elif move.pawn_promotion:
+                    stages[PROMOTIONS].append(move)
+                else:
+                    stages[QUIETS].append(move)
+            flags = (self.in_check, self.checkmate, self.stalemate)
+            for stage, stage_moves in stages.items():
+                if stage_moves or stage != HASH_MOVE:
+                    yield stage, stage_moves
+            self.in_check, self.checkmate, self.stalemate = flags
+            return
+
+        context = self.get_bitboard_context()
+        in_check = self.in_check
+        found = False
+        hash_id = hash_move & Move.ID_MASK
+        if hash_move:
+            # only the moves landing on the hash move's end square are generated to check it is legal
+            end_bit = 1 << ((hash_move >> 6) & 63)
+            candidates = []
+            self.get_bitboard_moves(context, end_bit, end_bit, candidates)
+            if hash_move & Move.CASTLE_FLAG:
+                self.get_bitboard_castle_moves(context, candidates)
+            for move in candidates:
+                if move.packed & Move.ID_MASK == hash_id:
+                    found = True
+                    yield HASH_MOVE, [move]
+                    break
+            if not found:
+                hash_id = -1
+
+        bb = self.bitboards
+        enemy = bb.occupancy[context[1]]
+        moves = []
+        self.get_bitboard_moves(context, enemy, enemy, moves)
+        if hash_id >= 0:
+            moves = [move for move in moves if move.packed & Move.ID_MASK != hash_id]
+        found = found or len(moves) > 0
+        yield CAPTURES, moves
+
+        promotion_rank = Bitboard.RANK_8 if self.white_to_move else Bitboard.RANK_1
+        empty = Bitboard.FULL ^ bb.occupied
+        moves = []
+        self.get_bitboard_moves(context, 0, empty & promotion_rank, moves, enpassant=False)
+        if hash_id >= 0:
+            moves = [move for move in moves if move.packed & Move.ID_MASK != hash_id]
+        found = found or len(moves) > 0
+        yield PROMOTIONS, moves
+
+        empty = Bitboard.FULL ^ bb.occupied
+        moves = []
+        self.get_bitboard_moves(context, empty, empty & ~promotion_rank, moves, enpassant=False)
+        self.get_bitboard_castle_moves(context, moves)
+        if hash_id >= 0:
+            moves = [move for move in moves if move.packed & Move.ID_MASK != hash_id]
+        found = found or len(moves) > 0
+        yield QUIETS, moves
+        self.in_check = in_check
+        self.checkmate = not found and in_check
+        self.stalemate = not found and not in_check
+
+    def get_bitboard_valid_moves(self):
+        # same move set as the board walk in get_valid_moves, computed with table lookups on self.bitboards
+        moves = []
+        context = self.get_bitboard_context()
+        self.get_bitboard_moves(context, Bitboard.FULL, Bitboard.FULL, moves)
+        self.get_bitboard_castle_moves(context, moves)
+
+        if len(moves) == 0:
+            if self.in_check:
+                self.checkmate = True
+            else:
+                self.stalemate = True
+        else:
             self.checkmate = False
+            self.stalemate = False
 
         return moves
 
+    def get_bitboard_context(self):
+        # what every bitboard move generation of the position needs: sets in_check and returns
+        # (ally_color, enemy_color, checkers, check_mask, pin_rays, attacked) with pin_rays mapping a pinned square
+        # to the ray it may still move along and attacked holding every square the king can't step to
+        bb = self.bitboards
+        pieces = bb.pieces
+        ally_color, enemy_color = ("w", "b") if self.white_to_move else ("b", "w")
+        own = bb.occupancy[ally_color]
+        occupied = bb.occupied
+        king_bit = pieces[ally_color + "K"]
+        king_sq = king_bit.bit_length() - 1
+
+        checkers = bb.attackers_to(king_sq, enemy_color, occupied)
+        self.in_check = checkers != 0
+        if not checkers:
+            check_mask = Bitboard.FULL
+        elif checkers & (checkers - 1) == 0:  # only 1 check, block check or capture the checker
+            check_mask = checkers | Bitboard.BETWEEN[king_sq][checkers.bit_length() - 1]
+        else:  # double check, king has to move
+            check_mask = 0
+        enemy_queens = pieces[enemy_color + "Q"]
+        pin_rays = {}
+        # only the directions with an enemy slider somewhere on their lines can hold a pin
+        directions = ()
+        if Bitboard.ROOK_LINES[king_sq] & (pieces[enemy_color + "R"] | enemy_queens):
+            directions = Bitboard.ROOK_DIRECTION_INDEXES
+        if Bitboard.BISHOP_LINES[king_sq] & (pieces[enemy_color + "B"] | enemy_queens):
+            directions += Bitboard.BISHOP_DIRECTION_INDEXES
+        for d in directions:
+            ray = Bitboard.RAYS[d][king_sq]
+            blockers = ray & occupied
+            if not blockers:
+                continue
+            if Bitboard.POSITIVE[d]:
+                first = blockers & -blockers
+                rest = blockers ^ first
+                second = rest & -rest
+            else:
+                first = 1 << (blockers.bit_length() - 1)
+                rest = blockers ^ first
+                second = 1 << (rest.bit_length() - 1) if rest else 0
+            if first & own and second:
+                pinners = pieces[enemy_color + ("R" if d < 4 else "B")] | enemy_queens
+                if second & pinners:
+                    pin_rays[first.bit_length() - 1] = ray
+        # looking through the king's own square so it can't step back along a checking ray
+        attacked = bb.attack_map(enemy_color, occupied ^ king_bit)
+        return ally_color, enemy_color, checkers, check_mask, pin_rays, attacked
+
+    def get_bitboard_moves(self, context, targets, pawn_targets, moves, enpassant=True):
+        # legal moves (castling aside) landing on targets, or on pawn_targets for pawns
+        ally_color, enemy_color, checkers, check_mask, pin_rays, attacked = context
+        bb = self.bitboards
+        pieces = bb.pieces
+        board = self.board
+        occupied = bb.occupied
+        not_own = Bitboard.FULL ^ bb.occupancy[ally_color]
+        if check_mask and (pawn_targets or enpassant):
+            self.get_bitboard_pawn_moves(
+                ally_color, enemy_color, check_mask & pawn_targets, pin_rays, moves, enpassant
+            )
+        piece_mask = not_own & check_mask & targets
+        if piece_mask:
+            # knights, a pinned knight can never move
+            knight = ally_color + "N"
+            knights = pieces[knight]
+            while knights:
+                low = knights & -knights
+                knights ^= low
+                sq = low.bit_length() - 1
+                if sq in pin_rays:
+                    continue
+                target_set = Bitboard.KNIGHT_ATTACKS[sq] & piece_mask
+                while target_set:
+                    low = target_set & -target_set
+                    target_set ^= low
+                    end = low.bit_length() - 1
+                    moves.append(packed_move(sq | end << 6, knight, board[end >> 3][end & 7]))
+            # sliding pieces
+            queens = pieces[ally_color + "Q"]
+            for sliders, attacks in (
+                (pieces[ally_color + "R"] | queens, Bitboard.rook_attacks),
+                (pieces[ally_color + "B"] | queens, Bitboard.bishop_attacks),
+            ):
+                while sliders:
+                    low = sliders & -sliders
+                    sliders ^= low
+                    sq = low.bit_length() - 1
+                    piece = board[sq >> 3][sq & 7]
+                    target_set = attacks(sq, occupied) & piece_mask
+                    if sq in pin_rays:
+                        target_set &= pin_rays[sq]
+                    while target_set:
+                        low = target_set & -target_set
+                        target_set ^= low
+                        end = low.bit_length() - 1
+                        moves.append(packed_move(sq | end << 6, piece, board[end >> 3][end & 7]))
+
+        king = ally_color + "K"
+        king_sq = pieces[king].bit_length() - 1
+        target_set = Bitboard.KING_ATTACKS[king_sq] & not_own & targets & ~attacked
+        while target_set:
+            low = target_set & -target_set
+            target_set ^= low
+            end = low.bit_length() - 1
+            moves.append(packed_move(king_sq | end << 6, king, board[end >> 3][end & 7]))
+
+    def get_bitboard_castle_moves(self, context, moves):
+        ally_color, enemy_color, checkers, check_mask, pin_rays, attacked = context
+        if checkers:
+            return
+        occupied = self.bitboards.occupied
+        king_bit = self.bitboards.pieces[ally_color + "K"]
+        king_sq = king_bit.bit_length() - 1
+        king_square = Bitboard.SQUARES[king_sq]
+        if (self.white_to_move and self.current_castling_right.wks) or (
+            not self.white_to_move and self.current_castling_right.bks
+        ):
+            path = (king_bit << 1) | (king_bit << 2)
+            if not path & (occupied | attacked):
+                moves.append(Move(king_square, Bitboard.SQUARES[king_sq + 2], self.board, castle=True))
+        if (self.white_to_move and self.current_castling_right.wqs) or (
+            not self.white_to_move and self.current_castling_right.bqs
+        ):
+            path = (king_bit >> 1) | (king_bit >> 2)
+            if not (path | (king_bit >> 3)) & occupied and not path & attacked:
+                moves.append(Move(king_square, Bitboard.SQUARES[king_sq - 2], self.board, castle=True))
+
+    def get_bitboard_pawn_moves(self, ally_color, enemy_color, check_mask, pin_rays, moves, enpassant=True):
+        pieces = self.bitboards.pieces
+        board = self.board
+        squares = Bitboard.SQUARES
+        pawns = pieces[ally_color + "p"]
+        occupied = self.bitboards.occupied
+        empty = Bitboard.FULL ^ occupied
+        enemy = self.bitboards.occupancy[enemy_color]
+        pinned = 0
+        for sq in pin_rays:
+            pinned |= 1 << sq
+        unpinned = pawns & ~pinned
+        # all unpinned pawns are shifted at once, each target set comes with the offset back to its start square
+        if self.white_to_move:
+            promotion_rank = Bitboard.RANK_8
+            single = (unpinned >> 8) & empty
+            double = ((single & Bitboard.RANK_3) >> 8) & empty & check_mask
+            targets = (
+                (single & check_mask, 8),
+                (((unpinned & Bitboard.NOT_FILE_A) >> 9) & enemy & check_mask, 9),
+                (((unpinned & Bitboard.NOT_FILE_H) >> 7) & enemy & check_mask, 7),
+            )
+            double_offset = 16
+        else:
+            promotion_rank = Bitboard.RANK_1
+            single = (unpinned << 8) & empty
+            double = ((single & Bitboard.RANK_6) << 8) & empty & check_mask
+            targets = (
+                (single & check_mask, -8),
+                (((unpinned & Bitboard.NOT_FILE_A) << 7) & enemy & check_mask, -7),
+                (((unpinned & Bitboard.NOT_FILE_H) << 9) & enemy & check_mask, -9),
+            )
+            double_offset = -16
+        pawn = ally_color + "p"
+        for target_set, offset in targets:
+            promotions = target_set & promotion_rank
+            target_set ^= promotions
+            while target_set:
+                low = target_set & -target_set
+                target_set ^= low
+                target = low.bit_length() - 1
+                moves.append(packed_move(target + offset | target << 6, pawn, board[target >> 3][target & 7]))
+            while promotions:
+                low = promotions & -promotions
+                promotions ^= low
+                target = low.bit_length() - 1
+                add_promotions(squares[target + offset], squares[target], board, moves)
+        while double:
+            low = double & -double
+            double ^= low
+            target = low.bit_length() - 1
+            moves.append(packed_move(target + double_offset | target << 6, pawn, "--"))
+
+        # pinned pawns may only move along the pin ray
+        pinned_pawns = pawns & pinned
+        forward = -8 if self.white_to_move else 8
+        pawn_attacks = Bitboard.PAWN_ATTACKS[ally_color]
+        for sq in Bitboard.iter_bits(pinned_pawns):
+            allowed = check_mask & pin_rays[sq]
+            one = sq + forward
+            if (empty >> one) & 1:
+                if (allowed >> one) & 1:
+                    if (promotion_rank >> one) & 1:
+                        add_promotions(squares[sq], squares[one], board, moves)
+                    else:
+                        moves.append(Move(squares[sq], squares[one], board))
+                two = one + forward
+                if sq // 8 == (6 if self.white_to_move else 1) and (empty & allowed) >> two & 1:
+                    moves.append(Move(squares[sq], squares[two], board))
+            for target in Bitboard.iter_bits(pawn_attacks[sq] & enemy & allowed):
+                if (promotion_rank >> target) & 1:
+                    add_promotions(squares[sq], squares[target], board, moves)
+                else:
+                    moves.append(Move(squares[sq], squares[target], board))
+
+        if enpassant and self.enpassant_possible:
+            ep_sq = Bitboard.square_index(*self.enpassant_possible)
+            king_sq = pieces[ally_color + "K"].bit_length() - 1
+            for sq in Bitboard.iter_bits(Bitboard.PAWN_ATTACKS[enemy_color][ep_sq] & pawns):
+                if self.is_bitboard_enpassant_legal(sq, ep_sq, king_sq, enemy_color):
+                    moves.append(Move(squares[sq], squares[ep_sq], board, enpassant_move=True))
+
+    def is_bitboard_enpassant_legal(self, sq, ep_sq, king_sq, enemy_color):
+        # play the capture on a copy of the occupancy and make sure no enemy piece sees the king afterwards,
+        # this covers both the captured pawn giving check and the two pawns leaving a rank at once
+        pieces = self.bitboards.pieces
+        captured_bit = 1 << (ep_sq - 8 if enemy_color == "w" else ep_sq + 8)
+        occupied = (self.bitboards.occupied ^ (1 << sq) ^ captured_bit) | (1 << ep_sq)
+        queens = pieces[enemy_color + "Q"]
+        if Bitboard.rook_attacks(king_sq, occupied) & (pieces[enemy_color + "R"] | queens):
+            return False
+        if Bitboard.bishop_attacks(king_sq, occupied) & (pieces[enemy_color + "B"] | queens):
+            return False
+        if Bitboard.KNIGHT_ATTACKS[king_sq] & pieces[enemy_color + "N"]:
+            return False
+        own_color = "b" if enemy_color == "w" else "w"
+        enemy_pawns = pieces[enemy_color + "p"] & ~captured_bit
+        return not Bitboard.PAWN_ATTACKS[own_color][king_sq] & enemy_pawns
+
+    def position_key(self):
+        # everything that decides the legal moves of the position
+        castle_rights = self.current_castling_right
+        return (
+            "".join(["".join(row) for row in self.board]),
+            self.white_to_move,
+            (castle_rights.wks, castle_rights.bks, castle_rights.wqs, castle_rights.bqs),
+            self.enpassant_possible,
+        )
+
     def check_for_pins_and_checks(self):
-        pins = []  # squares where the allied pinned piece is and direction pinned from
-        checks = []  # squares where enemy is applying a check
-        in_check = False
+        pin_directions = [()] * 64  # direction pinned from, for each square holding a pinned allied piece
+        check_mask = 0  # squares that capture a checking piece or block its ray
+        checks = 0  # number of enemy pieces applying a check
         rock_moves = ((-1, 0), (0, -1), (1, 0), (0, 1))
         bishop_moves = ((-1, -1), (-1, 1), (1, -1), (1, 1))
         white_pawn_moves = bishop_moves[0:2]
@@ -277,7 +772,7 @@ class GameState:
                         end_piece[0] == ally_color and end_piece[1] != "K"
                     ):  # 1st allied piece could be pinned
                         if possible_pin == ():
-                            possible_pin = (end_row, end_col, d[0], d[1])
+                            possible_pin = (end_row, end_col)
                         else:  # 2nd allied piece, so no pin or check possible in this direction
                             break
                     elif end_piece[0] == enemy_color:
@@ -304,10 +799,12 @@ class GameState:
                             or (i == 1 and piece_type == "K")
                         ):
                             if possible_pin == ():  # no piece blocking, so check
-                                in_check = True
-                                checks.append((end_row, end_col, d[0], d[1]))
+                                checks += 1
+                                for k in range(1, i + 1):  # every square from the king up to the checker
+                                    check_mask |= 1 << ((start_row + d[0] * k) * 8 + start_col + d[1] * k)
+                                break
                             else:  # piece blocking so pin
-                                pins.append(possible_pin)
+                                pin_directions[possible_pin[0] * 8 + possible_pin[1]] = d
                                 break
                         else:
                             break
@@ -331,10 +828,14 @@ class GameState:
             if 0 <= end_row < 8 and 0 <= end_col < 8:
                 end_piece = self.board[end_row][end_col]
                 if end_piece[0] == enemy_color and end_piece[1] == "N":
-                    in_check = True
-                    checks.append((end_row, end_col, m[0], m[1]))
+                    checks += 1
+                    check_mask |= 1 << (end_row * 8 + end_col)  # a knight can't be blocked, only captured
 
-        return in_check, pins, checks
+        if checks == 0:
+            check_mask = Bitboard.FULL
+        elif checks > 1:  # double check, no capture or block helps
+            check_mask = 0
+        return checks > 0, pin_directions, check_mask
 
     def get_valid_moves_old(self):
         print("white_to_move", self.white_to_move)
@@ -385,15 +886,14 @@ class GameState:
             return self.square_under_attack(self.black_king_location)
 
     def square_under_attack(self, location):
-        r, c = location
-        self.white_to_move = not self.white_to_move  # switch to opponent's turn
-        opponent_moves = self.get_all_possible_moves()
-        self.white_to_move = not self.white_to_move  # switch turns back
-        for move in opponent_moves:
-            if move.end_row == r and move.end_col == c:
-                return True
+        return self.is_square_attacked(location, self.get_enemy_color())
 
-        return False
+    def is_square_attacked(self, square, by_color):
+        # a few attack table lookups around the square, no moves are generated
+        r, c = square
+        if self.bitboards is not None:
+            return self.bitboards.is_square_attacked(r * 8 + c, by_color)
+        return AttackTables.is_square_attacked(self.board, r, c, by_color)
 
     def get_all_possible_moves(self):
         moves = []
@@ -409,15 +909,9 @@ class GameState:
         return moves
 
     def get_pawn_moves(self, r, c, moves):
-        piece_pinned = False
-        pin_direction = ()
+        pin_direction = self.pin_directions[r * 8 + c]
+        check_mask = self.check_mask
         start_square = (r, c)
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piece_pinned = True
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
         if self.white_to_move:
             move_amount = -1
             start_row = 6
@@ -429,76 +923,75 @@ class GameState:
             back_row = 7
             enemy_color = "w"
 
-        pawn_promotion = False
+        pawn_promotion = r + move_amount == back_row
 
         if self.board[r + move_amount][c] == "--":  # 1 square pawn advance
-            if not piece_pinned or pin_direction == (move_amount, 0):
-                if r + move_amount == back_row:
-                    pawn_promotion = True
-                moves.append(
-                    Move(
-                        start_square,
-                        (r + move_amount, c),
-                        self.board,
-                        pawn_promotion=pawn_promotion,
-                    )
-                )
+            # a pawn pinned along its file can still move, whichever side of it the king is on
+            if not pin_direction or pin_direction in ((move_amount, 0), (-move_amount, 0)):
+                if check_mask >> ((r + move_amount) * 8 + c) & 1:
+                    if pawn_promotion:
+                        add_promotions(start_square, (r + move_amount, c), self.board, moves)
+                    else:
+                        moves.append(Move(start_square, (r + move_amount, c), self.board))
                 if (
-                    r == start_row and self.board[r + 2 * move_amount][c] == "--"
+                    r == start_row
+                    and self.board[r + 2 * move_amount][c] == "--"
+                    and check_mask >> ((r + 2 * move_amount) * 8 + c) & 1
                 ):  # 2 square pawn advance
                     moves.append(
                         Move(start_square, (r + 2 * move_amount, c), self.board)
                     )
 
-        if c - 1 >= 0:  # capture to the left
-            if not piece_pinned or pin_direction == (move_amount, -1):
-                if (
-                    self.board[r + move_amount][c - 1][0] == enemy_color
-                ):  # enemy piece to capture
-                    if r + move_amount == back_row:
-                        pawn_promotion = True
-                    moves.append(
-                        Move(
-                            start_square,
-                            (r + move_amount, c - 1),
-                            self.board,
-                            pawn_promotion=pawn_promotion,
-                        )
-                    )
-                if (r + move_amount, c - 1) == self.enpassant_possible:
-                    moves.append(
-                        Move(
-                            start_square,
-                            (r + move_amount, c - 1),
-                            self.board,
-                            enpassant_move=True,
-                        )
+        for col_amount in (-1, 1):  # capture to the left, then to the right
+            if not 0 <= c + col_amount <= 7:
+                continue
+            if pin_direction and pin_direction not in (
+                (move_amount, col_amount),
+                (-move_amount, -col_amount),
+            ):
+                continue
+            end_square = (r + move_amount, c + col_amount)
+            if (
+                self.board[end_square[0]][end_square[1]][0] == enemy_color
+                and check_mask >> (end_square[0] * 8 + end_square[1]) & 1
+            ):  # enemy piece to capture
+                if pawn_promotion:
+                    add_promotions(start_square, end_square, self.board, moves)
+                else:
+                    moves.append(Move(start_square, end_square, self.board))
+            if (
+                end_square == self.enpassant_possible
+                # lands on a blocking square, or takes the checking pawn which isn't on the landing square
+                and check_mask >> (end_square[0] * 8 + end_square[1]) & 1
+                | check_mask >> (r * 8 + end_square[1]) & 1
+                and not self.enpassant_exposes_king(r, c, c + col_amount)
+            ):
+                moves.append(
+                    Move(
+                        start_square,
+                        end_square,
+                        self.board,
+                        enpassant_move=True,
                     )
+                )
 
-        if c + 1 <= 7:  # capture to the right
-            if not piece_pinned or pin_direction == (move_amount, 1):
-                if (
-                    self.board[r + move_amount][c + 1][0] == enemy_color
-                ):  # enemy piece to capture
-                    if r + move_amount == back_row:
-                        pawn_promotion = True
-                    moves.append(
-                        Move(
-                            start_square,
-                            (r + move_amount, c + 1),
-                            self.board,
-                            pawn_promotion=pawn_promotion,
-                        )
-                    )
-                if (r + move_amount, c + 1) == self.enpassant_possible:
-                    moves.append(
-                        Move(
-                            start_square,
-                            (r + move_amount, c + 1),
-                            self.board,
-                            enpassant_move=True,
-                        )
-                    )
+    def enpassant_exposes_king(self, r, c, captured_col):
+        # both pawns leave row r at once, which the pin scan can't see when the king shares that row
+        king_row, king_col = (
+            self.white_king_location if self.white_to_move else self.black_king_location
+        )
+        if king_row != r:
+            return False
+        enemy_color = self.get_enemy_color()
+        step = 1 if captured_col > king_col else -1
+        col = king_col + step
+        while 0 <= col < 8:
+            if col not in (c, captured_col):
+                piece = self.board[r][col]
+                if piece != "--":
+                    return piece[0] == enemy_color and piece[1] in ("R", "Q")
+            col += step
+        return False
 
     def get_rook_moves(self, r, c, moves):
         directions = ((-1, 0), (0, -1), (1, 0), (0, 1))
@@ -528,70 +1021,51 @@ class GameState:
         self.calculate_moves_knight(r, c, knight_moves, moves)
 
     def get_king_moves(self, r, c, moves):
-        row_moves = (-1, -1, -1, 0, 0, 1, 1, 1)
-        col_moves = (-1, 0, 1, -1, 1, -1, 0, 1)
         start_square = (r, c)
         ally_color = self.get_ally_color()
-
-        for i in range(8):
-            end_row = r + row_moves[i]
-            end_col = c + col_moves[i]
-            end_square = (end_row, end_col)
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] != ally_color:
-                    if ally_color == "w":
-                        self.white_king_location = (end_row, end_col)
-                    else:
-                        self.black_king_location = (end_row, end_col)
-                    in_check, pins, checks = self.check_for_pins_and_checks()
-                    if not in_check:
-                        moves.append(Move(start_square, end_square, self.board))
-                    if ally_color == "w":
-                        self.white_king_location = (r, c)
-                    else:
-                        self.black_king_location = (r, c)
+        enemy_color = self.get_enemy_color()
+        # lift the king off the board so squares behind it along a checking ray count as attacked
+        king = self.board[r][c]
+        self.board[r][c] = "--"
+        end_squares = [
+            (end_row, end_col)
+            for end_row, end_col in AttackTables.KING_SQUARES[r * 8 + c]
+            if self.board[end_row][end_col][0] != ally_color
+            and not AttackTables.is_square_attacked(self.board, end_row, end_col, enemy_color)
+        ]
+        self.board[r][c] = king
+        for end_square in end_squares:
+            moves.append(Move(start_square, end_square, self.board))
 
     def get_enemy_color(self):
         enemy_color = "b" if self.white_to_move else "w"
         return enemy_color
 
     def calculate_moves_rook_bishop(self, r, c, directions, moves, piece):
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piece_pinned = True
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                if (
-                    self.board[r][c][1] != "Q" and piece == "R"
-                ):  # can't remove queen from pin on rock moves, only remove it on bishop moves
-                    self.pins.remove(self.pins[i])
-                elif piece == "B":
-                    self.pins.remove(self.pins[i])
-                break
-
+        pin_direction = self.pin_directions[r * 8 + c]
+        check_mask = self.check_mask
+        in_check = self.in_check  # out of check every square passes check_mask, skip the test
         start_square = (r, c)
         enemy_color = self.get_enemy_color()
         for d in directions:
+            # a pinned piece may only slide along the pin, towards the king or towards the pinning piece
+            if pin_direction and pin_direction != d and pin_direction != (-d[0], -d[1]):
+                continue
             for i in range(1, 8):
                 end_row = r + d[0] * i
                 end_col = c + d[1] * i
                 end_square = (end_row, end_col)
                 if 0 <= end_row < 8 and 0 <= end_col < 8:
-                    if (
-                        not piece_pinned
-                        or pin_direction == d
-                        or pin_direction == (-d[0], -d[1])
-                    ):
-                        end_piece = self.board[end_row][end_col]
-                        if end_piece == "--":
+                    end_piece = self.board[end_row][end_col]
+                    if end_piece == "--":
+                        if not in_check or check_mask >> (end_row * 8 + end_col) & 1:
                             moves.append(Move(start_square, end_square, self.board))
-                        elif end_piece[0] == enemy_color:
+                    elif end_piece[0] == enemy_color:
+                        if not in_check or check_mask >> (end_row * 8 + end_col) & 1:
                             moves.append(Move(start_square, end_square, self.board))
-                            break
-                        else:  # friendly piece invalid
-                            break
+                        break
+                    else:  # friendly piece invalid
+                        break
                 else:  # off board
                     break
 
@@ -600,12 +1074,9 @@ class GameState:
         return ally_color
 
     def calculate_moves_knight(self, r, c, directions, moves):
-        piece_pinned = False
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piece_pinned = True
-                self.pins.remove(self.pins[i])
-                break
+        if self.pin_directions[r * 8 + c]:  # a pinned knight can never move
+            return
+        check_mask = self.check_mask
         start_square = (r, c)
         ally_color = self.get_ally_color()
         for m in directions:
@@ -613,14 +1084,12 @@ class GameState:
             end_col = c + m[1]
             end_square = (end_row, end_col)
             if 0 <= end_row < 8 and 0 <= end_col < 8:
-                if not piece_pinned:
-                    end_piece = self.board[end_row][end_col]
-                    if end_piece[0] != ally_color:
-                        moves.append(Move(start_square, end_square, self.board))
+                end_piece = self.board[end_row][end_col]
+                if end_piece[0] != ally_color and check_mask >> (end_row * 8 + end_col) & 1:
+                    moves.append(Move(start_square, end_square, self.board))
 
     def get_castle_moves(self, r, c, moves):
-        location = (r, c)
-        if self.square_under_attack(location):
+        if self.in_check:  # set by get_valid_moves for the current position
             return
         if (self.white_to_move and self.current_castling_right.wks) or (
             not self.white_to_move and self.current_castling_right.bks
@@ -650,6 +1119,21 @@ class GameState:
                 moves.append(Move((r, c), (r, c - 2), self.board, castle=True))
 
 
+def packed_move(packed, piece_moved, piece_captured):
+    # a move built straight from its packed squares, for the bitboard generator that already has them as indexes
+    move = new_move(Move)
+    move.packed = packed
+    move.piece_moved = piece_moved
+    move.piece_captured = piece_captured
+    return move
+
+
+def add_promotions(start_square, end_square, board, moves):
+    # a pawn reaching the last rank is four different moves, one for each piece it can become
+    for piece in Move.PROMOTION_PIECES:
+        moves.append(Move(start_square, end_square, board, promotion_piece=piece))
+
+
 class CastleRights:
     def __init__(self, wks, bks, wqs, bqs):
         self.wks = wks
@@ -659,6 +1143,18 @@ class CastleRights:
 
 
 class Move:
+    # a move is packed into one integer: bits 0-5 hold the start square and bits 6-11 the end square
+    # (square = row * 8 + col), followed by one bit each for en passant, castling and pawn promotion and two bits
+    # for the index of the promotion piece in PROMOTION_PIECES.
+    # Only the two piece strings are kept beside it, everything else is read out of the packed integer on demand
+    __slots__ = ("packed", "piece_moved", "piece_captured")
+    ENPASSANT_FLAG = 1 << 12
+    CASTLE_FLAG = 1 << 13
+    PROMOTION_FLAG = 1 << 14
+    PROMOTION_SHIFT = 15
+    PROMOTION_PIECES = ("Q", "R", "B", "N")
+    ID_MASK = 0xFFF | PROMOTION_FLAG | 3 << PROMOTION_SHIFT  # squares and promotion piece
+
     # maps keys to values
     # key: value
     ranks_to_rows = {"1": 7, "2": 6, "3": 5, "4": 4, "5": 3, "6": 2, "7": 1, "8": 0}
@@ -672,39 +1168,83 @@ class Move:
         end_sq,
         board,
         enpassant_move=False,
-        pawn_promotion=False,
+        promotion_piece=None,
         castle=False,
     ):
-        self.start_row = start_sq[0]
-        self.start_col = start_sq[1]
-        self.end_row = end_sq[0]
-        self.end_col = end_sq[1]
-        self.piece_moved = board[self.start_row][self.start_col]
-        self.piece_captured = board[self.end_row][self.end_col]
-
-        self.enpassant_move = enpassant_move
-        self.pawn_promotion = pawn_promotion
-        self.castle = castle
-
+        start_row, start_col = start_sq
+        end_row, end_col = end_sq
+        self.piece_moved = board[start_row][start_col]
+        packed = start_row << 3 | start_col | end_row << 9 | end_col << 6
         if enpassant_move:
             self.piece_captured = "bp" if self.piece_moved == "wp" else "wp"
+            packed |= Move.ENPASSANT_FLAG
+        else:
+            self.piece_captured = board[end_row][end_col]
+        if promotion_piece is not None:
+            packed |= Move.PROMOTION_FLAG | Move.PROMOTION_PIECES.index(promotion_piece) << Move.PROMOTION_SHIFT
+        if castle:
+            packed |= Move.CASTLE_FLAG
+        self.packed = packed
 
-        self.move_id = (
-            self.start_row * 1000
-            + self.start_col * 100
-            + self.end_row * 10
-            + self.end_col
-        )
+    @property
+    def start_row(self):
+        return (self.packed >> 3) & 7
+
+    @property
+    def start_col(self):
+        return self.packed & 7
+
+    @property
+    def end_row(self):
+        return (self.packed >> 9) & 7
+
+    @property
+    def end_col(self):
+        return (self.packed >> 6) & 7
+
+    @property
+    def enpassant_move(self):
+        return self.packed & Move.ENPASSANT_FLAG != 0
+
+    @property
+    def pawn_promotion(self):
+        return self.packed & Move.PROMOTION_FLAG != 0
+
+    @property
+    def promotion_piece(self):
+        # "Q", "R", "B" or "N" for a promotion, None otherwise
+        if self.packed & Move.PROMOTION_FLAG:
+            return Move.PROMOTION_PIECES[(self.packed >> Move.PROMOTION_SHIFT) & 3]
+        return None
+
+    @property
+    def castle(self):
+        return self.packed & Move.CASTLE_FLAG != 0
+
+    @property
+    def move_id(self):
+        # start and end square plus the promotion piece, which is what identifies a move to the player
+        return self.packed & Move.ID_MASK
 
     def __eq__(self, other):
         if isinstance(other, Move):
-            return self.move_id == other.move_id
+            return self.packed & Move.ID_MASK == other.packed & Move.ID_MASK
         return False
 
+    def __hash__(self):
+        return self.packed & Move.ID_MASK
+
+    def __repr__(self):
+        return "Move(%s)" % self.get_chess_notation()
+
     def get_chess_notation(self):
-        return self.get_rank_file(self.start_row, self.start_col) + self.get_rank_file(
-            self.end_row, self.end_col
-        )
+        notation = self.get_rank_file(self.start_row, self.start_col) + self.get_rank_file(self.end_row, self.end_col)
+        if self.packed & Move.PROMOTION_FLAG:
+            notation += self.promotion_piece.lower()
+        return notation
 
     def get_rank_file(self, row, col):
         return self.cols_to_files[col] + self.rows_to_ranks[row]
+
+
+new_move = Move.__new__  # used by packed_move, skips the square unpacking of Move.__init__
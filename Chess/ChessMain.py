@@ -2,136 +2,260 @@
 This is our main driver file. It will be responsible for handling user input and displaying the current GameState object.
 """
 
+import argparse
+import sys
+import time
+
 import pygame as p
-from Chess import ChessEngine
+from Chess import ChessEngine, EngineWorker, Profiler, SpriteCache
 
-WIDTH = HEIGHT = 512
+WIDTH = HEIGHT = 512  # initial window size, the board follows the window when it is resized
 DIMENSION = 8
-SQ_SIZE = HEIGHT // DIMENSION
-MAX_FPS = 15
-IMAGES = {}
+MIN_SQ_SIZE = 16
+WORKER_POLL_MS = 20  # how often the loop checks for engine results while the worker is busy
+ANIMATION_SECONDS_PER_SQUARE = 0.03
+ANIMATION_MAX_SECONDS = 0.25
+ANIMATION_MAX_FPS = 120
+SPRITES = SpriteCache.SpriteCache()
+COMPUTER_THINK_TIME = 2.0  # seconds per computer move
+BOARD_COLORS = (p.Color("white"), p.Color("gray"))
 
 
-def load_images():
-    pieces = ["wp", "wR", "wN", "wB", "wQ", "wK", "bp", "bR", "bN", "bB", "bQ", "bK"]
-    for piece in pieces:
-        IMAGES[piece] = p.transform.scale(
-            p.image.load("images/" + piece + ".png"), (SQ_SIZE, SQ_SIZE)
-        )
+class BoardRenderer:
+    # draws the game onto the screen, only the squares whose content changed since the last frame are redrawn and
+    # pushed to the display with p.display.update(rects)
+    def __init__(self, screen):
+        self.resize(screen)
+
+    def resize(self, screen):
+        # the largest board that fits the window, everything cached for the old size is rebuilt
+        self.screen = screen
+        self.sq_size = max(MIN_SQ_SIZE, min(screen.get_size()) // DIMENSION)
+        board_size = self.sq_size * DIMENSION
+        self.background = p.Surface((board_size, board_size)).convert()  # the empty board, drawn once
+        draw_board(self.background, self.sq_size)
+        self.highlights = {}
+        for name, color in (("selected", "blue"), ("target", "yellow"), ("picker", "lightblue")):
+            s = p.Surface((self.sq_size, self.sq_size))
+            if name != "picker":
+                s.set_alpha(100)  # transparency value -> 0 transparent; 255 opaque
+            s.fill(p.Color(color))
+            self.highlights[name] = s
+        screen.fill(p.Color("white"))
+        p.display.update()
+        self.invalidate()
+
+    def invalidate(self):
+        # something else drew on the screen, the next frame redraws everything
+        self.drawn = None
+        self.overlay = None
+
+    def sprite(self, piece):
+        return SPRITES.get(piece, self.sq_size)
+
+    def square_rect(self, r, c):
+        return p.Rect(c * self.sq_size, r * self.sq_size, self.sq_size, self.sq_size)
+
+    def square_at(self, location):
+        # (row, column) under a window position, None outside the board
+        col, row = location[0] // self.sq_size, location[1] // self.sq_size
+        if 0 <= row < DIMENSION and 0 <= col < DIMENSION:
+            return row, col
+        return None
+
+    def square_states(self, gs, moves_by_square, sq_selected):
+        highlights = [None] * 64
+        if sq_selected != ():
+            r, c = sq_selected
+            if gs.board[r][c][0] == ("w" if gs.white_to_move else "b"):
+                highlights[r * 8 + c] = "selected"
+                for end_row, end_col in moves_by_square.get(sq_selected, ()):
+                    highlights[end_row * 8 + end_col] = "target"
+        return [(gs.board[sq // 8][sq % 8], highlights[sq]) for sq in range(64)]
+
+    def draw(self, gs, moves_by_square, sq_selected, promotion_choices=(), text=None):
+        states = self.square_states(gs, moves_by_square, sq_selected)
+        overlay = (tuple(move.move_id for move in promotion_choices), text) if promotion_choices or text else None
+        if self.drawn is None or overlay != self.overlay or (overlay is not None and states != self.drawn):
+            # an overlay spans several squares, any change under or of it redraws the whole board
+            dirty = range(64)
+        else:
+            dirty = [sq for sq in range(64) if states[sq] != self.drawn[sq]]
+        if not dirty:
+            return
+        rects = []
+        for sq in dirty:
+            rects.append(self.draw_square(sq, *states[sq]))
+        if promotion_choices:
+            self.draw_promotion_picker(promotion_choices)
+        if text:
+            self.draw_text(text)
+        self.drawn = states
+        self.overlay = overlay
+        p.display.update(rects)
+
+    def animate_move(self, move, board, clock):
+        # board is the position after the move. Everything but the moving piece is rendered once, then every frame
+        # only restores the background under the sprite's last position and blits it at the new one
+        static = self.background.copy()
+        for r in range(DIMENSION):
+            for c in range(DIMENSION):
+                piece = board[r][c]
+                if (r, c) == (move.end_row, move.end_col):
+                    piece = move.piece_captured  # still standing there until the moving piece arrives
+                    if move.enpassant_move:
+                        piece = "--"
+                if piece != "--":
+                    static.blit(self.sprite(piece), self.square_rect(r, c))
+        self.screen.blit(static, (0, 0))
+        p.display.update(static.get_rect())
 
+        sq_size = self.sq_size
+        start_x, start_y = move.start_col * sq_size, move.start_row * sq_size
+        delta_x, delta_y = move.end_col * sq_size - start_x, move.end_row * sq_size - start_y
+        squares = abs(move.end_row - move.start_row) + abs(move.end_col - move.start_col)
+        duration = min(ANIMATION_MAX_SECONDS, ANIMATION_SECONDS_PER_SQUARE * squares)
+        sprite = self.sprite(move.piece_moved)
+        start_time = time.perf_counter()
+        last_rect = None
+        while True:
+            # the position depends on the time passed, so a slow frame skips ahead instead of slowing down
+            progress = min(1.0, (time.perf_counter() - start_time) / duration) if duration > 0 else 1.0
+            rect = p.Rect(round(start_x + delta_x * progress), round(start_y + delta_y * progress), sq_size, sq_size)
+            rects = [rect]
+            if last_rect is not None:
+                self.screen.blit(static, last_rect, last_rect)
+                rects.append(last_rect)
+            self.screen.blit(sprite, rect)
+            p.display.update(rects)
+            last_rect = rect
+            if progress >= 1.0:
+                break
+            clock.tick(ANIMATION_MAX_FPS)
 
-def draw_game_state(screen, gs, valid_moves, sq_selected):
-    draw_board(screen)
-    highlight_squares(screen, gs, valid_moves, sq_selected)
-    draw_pieces(screen, gs.board)
+        # the sprite now covers the end square, draw the square properly and continue from a known screen
+        self.drawn = [(board[sq // 8][sq % 8], None) for sq in range(64)]
+        self.overlay = None
+        p.display.update(self.draw_square(move.end_row * 8 + move.end_col, board[move.end_row][move.end_col], None))
 
+    def draw_square(self, sq, piece, highlight):
+        rect = self.square_rect(*divmod(sq, 8))
+        self.screen.blit(self.background, rect, rect)
+        if highlight is not None:
+            self.screen.blit(self.highlights[highlight], rect)
+        if piece != "--":
+            self.screen.blit(self.sprite(piece), rect)
+        return rect
 
-def draw_board(screen):
-    global colors
-    colors = [p.Color("white"), p.Color("gray")]
+    def draw_promotion_picker(self, choices):
+        for move, (r, c) in zip(choices, promotion_picker_squares(choices[0])):
+            rect = self.square_rect(r, c)
+            self.screen.blit(self.highlights["picker"], rect)
+            self.screen.blit(self.sprite(move.piece_moved[0] + move.promotion_piece), rect)
+
+    def draw_text(self, text):
+        board_size = self.sq_size * DIMENSION
+        font = p.font.SysFont("Helvitca", max(12, self.sq_size // 2), True, False)
+        text_object = font.render(text, 0, p.Color("gray"))
+        text_location = p.Rect(0, 0, board_size, board_size).move(
+            board_size / 2 - text_object.get_width() / 2,
+            board_size / 2 - text_object.get_height() / 2,
+        )
+        self.screen.blit(text_object, text_location)
+        text_object = font.render(text, 0, p.Color("darkgreen"))
+        self.screen.blit(text_object, text_location.move(2, 2))
+
+
+def draw_board(screen, sq_size):
     for r in range(DIMENSION):
         for c in range(DIMENSION):
-            color = colors[(r + c) % 2]
+            color = BOARD_COLORS[(r + c) % 2]
             p.draw.rect(
-                screen, color, p.Rect(c * SQ_SIZE, r * SQ_SIZE, SQ_SIZE, SQ_SIZE)
+                screen, color, p.Rect(c * sq_size, r * sq_size, sq_size, sq_size)
             )
 
 
-def draw_pieces(screen, board):
-    for r in range(DIMENSION):
-        for c in range(DIMENSION):
-            piece = board[r][c]
-            if piece != "--":
-                screen.blit(
-                    IMAGES[piece], p.Rect(c * SQ_SIZE, r * SQ_SIZE, SQ_SIZE, SQ_SIZE)
-                )
+def index_moves(moves):
+    # {(start_row, start_col): {(end_row, end_col): [moves]}}, several moves share squares only for a promotion
+    moves_by_square = {}
+    for move in moves:
+        targets = moves_by_square.setdefault((move.start_row, move.start_col), {})
+        targets.setdefault((move.end_row, move.end_col), []).append(move)
+    return moves_by_square
 
 
-def highlight_squares(screen, gs, valid_moves, sq_selected):
-    if sq_selected != ():
-        r, c = sq_selected
-        if gs.board[r][c][0] == ("w" if gs.white_to_move else "b"):
-            s = p.Surface((SQ_SIZE, SQ_SIZE))
-            s.set_alpha(100)  # transparency value -> 0 transparent; 255 opaque
-            s.fill(p.Color("blue"))
-            screen.blit(s, (c * SQ_SIZE, r * SQ_SIZE))
-
-            s.fill((p.Color("yellow")))
-            for move in valid_moves:
-                if move.start_row == r and move.start_col == c:
-                    screen.blit(s, (move.end_col * SQ_SIZE, move.end_row * SQ_SIZE))
-
-
-def animate_move(move, screen, board, clock):
-    global colors
-    delta_row = move.end_row - move.start_row
-    delta_col = move.end_col - move.start_col
-
-    frame_per_square = 10  # frames to move one square
-    frame_count = (abs(delta_row) + abs(delta_col)) * frame_per_square
-    for frame in range(frame_count + 1):
-        r, c = (
-            move.start_row + delta_row * frame / frame_count,
-            move.start_col + delta_col * frame / frame_count,
-        )
-        draw_board(screen)
-        draw_pieces(screen, board)
-        # erase the piece moved from its ending square
-        color = colors[(move.end_row + move.end_col) % 2]
-        end_square = p.Rect(
-            move.end_col * SQ_SIZE, move.end_row * SQ_SIZE, SQ_SIZE, SQ_SIZE
-        )
-        p.draw.rect(screen, color, end_square)
-        # draw captured piece onto rectangle
-        if move.piece_captured != "--":
-            screen.blit(IMAGES[move.piece_captured], end_square)
-        # draw moving piece
-        screen.blit(
-            IMAGES[move.piece_moved], p.Rect(int(c) * SQ_SIZE, int(r) * SQ_SIZE, SQ_SIZE, SQ_SIZE)
-        )
-        p.display.flip()
-        clock.tick(360)
-
+def promotion_picker_squares(move):
+    # the four choices are stacked from the promotion square towards the middle of the board
+    direction = 1 if move.end_row == 0 else -1
+    return [(move.end_row + i * direction, move.end_col) for i in range(len(ChessEngine.Move.PROMOTION_PIECES))]
 
-def draw_text(screen, text):
-    font = p.font.SysFont("Helvitca", 32, True, False)
-    text_object = font.render(text, 0, p.Color("gray"))
-    text_location = p.Rect(0, 0, WIDTH, HEIGHT).move(
-        WIDTH / 2 - text_object.get_width() / 2,
-        HEIGHT / 2 - text_object.get_height() / 2,
-    )
-    screen.blit(text_object, text_location)
-    text_object = font.render(text, 0, p.Color("darkgreen"))
-    screen.blit(text_object, text_location.move(2, 2))
 
-
-def main():
+def main(
+    white_human=True,
+    black_human=True,
+    think_time=COMPUTER_THINK_TIME,
+    fen=ChessEngine.START_FEN,
+    profile=False,
+    book=None,
+    tablebases=None,
+):
+    if profile:
+        Profiler.enable()
     p.init()
-    screen = p.display.set_mode((WIDTH, HEIGHT))
+    screen = p.display.set_mode((WIDTH, HEIGHT), p.RESIZABLE)
     clock = p.time.Clock()
-    screen.fill(p.Color("white"))
-    gs = ChessEngine.GameState()
-    load_images()
+    gs = ChessEngine.GameState.from_fen(fen, use_bitboards=True)
+    SPRITES.load()
+    renderer = BoardRenderer(screen)
     running = True
     sq_selected = ()  # no square is selected, keep track of the last click of the user (tuple: (row, column))
     player_clicks = (
         []
     )  # keep track of player clicks (two tuples: [(row, column), (row, column)])
-    valid_moves = gs.get_valid_moves()
+    # legal moves and computer moves are computed in a worker process, the loop only polls for them
+    worker = EngineWorker.EngineWorker(profile, book, tablebases)
+    worker.valid_moves(gs)
+    valid_moves = []
+    moves_by_square = {}  # valid_moves by start and end square, so clicks and highlights are dict lookups
+    moves_ready = False  # flag variable for when valid_moves belongs to the current position
+    promotion_choices = []  # the promotion moves of the picker on screen, empty while it is closed
     move_made = False  # flag variable for when move is made
     animate = False  # flag variable for when we should animate a move
     game_over = False
 
     while running:
-        for e in p.event.get():
+        human_turn = (gs.white_to_move and white_human) or (
+            not gs.white_to_move and black_human
+        )
+        # sleep until something happens, only a busy worker makes the loop wake up to poll for its result
+        event = p.event.wait(WORKER_POLL_MS) if worker.busy else p.event.wait()
+        events = p.event.get()
+        if event.type != p.NOEVENT:
+            events.insert(0, event)
+        for e in events:
             if e.type == p.QUIT:
                 running = False
+            elif e.type == p.VIDEORESIZE:
+                renderer.resize(p.display.get_surface())
+            elif e.type in (p.VIDEOEXPOSE, p.WINDOWEXPOSED):
+                renderer.invalidate()
             # mouse handler
             elif e.type == p.MOUSEBUTTONDOWN:
-                if not game_over:
-                    location = p.mouse.get_pos()
-                    col = location[0] // SQ_SIZE
-                    row = location[1] // SQ_SIZE
+                if not game_over and human_turn:
+                    clicked = renderer.square_at(e.pos)
+                    if promotion_choices:  # a click on a choice promotes, anywhere else cancels
+                        for move, square in zip(promotion_choices, promotion_picker_squares(promotion_choices[0])):
+                            if square == clicked:
+                                gs.make_move(move)
+                                move_made = True
+                                animate = True
+                        promotion_choices = []
+                        sq_selected = ()
+                        player_clicks = []
+                        continue
+                    if clicked is None:  # beside the board in a wide window
+                        continue
+                    row, col = clicked
                     if sq_selected == (
                         row,
                         col,
@@ -143,53 +267,120 @@ def main():
                         player_clicks.append(sq_selected)
 
                     if len(player_clicks) == 2:
-                        move = ChessEngine.Move(
-                            player_clicks[0], player_clicks[1], gs.board
-                        )
-                        print(move.get_chess_notation())
-                        for i in range(len(valid_moves)):
-                            if move == valid_moves[i]:
-                                gs.make_move(valid_moves[i])
-                                move_made = True
-                                animate = True
-                                sq_selected = ()  # reset user clocks
-                                player_clicks = []
-                        if not move_made:
+                        # every legal move between the two squares, four of them for a promotion
+                        candidates = moves_by_square.get(player_clicks[0], {}).get(player_clicks[1], ())
+                        if len(candidates) == 1:
+                            print(candidates[0].get_chess_notation())
+                            gs.make_move(candidates[0])
+                            move_made = True
+                            animate = True
+                            sq_selected = ()  # reset user clocks
+                            player_clicks = []
+                        elif candidates:
+                            promotion_choices = candidates
+                        else:
                             player_clicks = [sq_selected]
             # key handler
             elif e.type == p.KEYDOWN:
                 if e.key == p.K_z:  # undo when 'z' is pressed
+                    worker.cancel()  # drop anything computed for the position being undone
                     gs.undo_move()
+                    promotion_choices = []
+                    sq_selected = ()
+                    player_clicks = []
                     move_made = True
                     animate = False
+                    game_over = False
                 if e.key == p.K_r:  # reset the board when 'r is pressed
-                    gs = ChessEngine.GameState()
-                    valid_moves = gs.get_valid_moves()
+                    worker.cancel()
+                    gs = ChessEngine.GameState.from_fen(fen, use_bitboards=True)
+                    promotion_choices = []
                     sq_selected = ()
-                    move_made = False
+                    player_clicks = []
+                    move_made = True
                     animate = False
+                    game_over = False
+
+        # engine results
+        engine_result = worker.poll()
+        if engine_result is not None:
+            kind, result = engine_result
+            if kind == EngineWorker.VALID_MOVES:
+                valid_moves, gs.in_check, gs.checkmate, gs.stalemate = result
+                moves_by_square = index_moves(valid_moves)
+                moves_ready = True
+            elif kind == EngineWorker.SEARCH:
+                print(
+                    "%s score %d depth %d nodes %d (%d nodes/s)"
+                    % (
+                        result.best_move.get_chess_notation(),
+                        result.score,
+                        result.depth,
+                        result.nodes,
+                        result.nodes_per_second,
+                    )
+                )
+                gs.make_move(result.best_move)
+                move_made = True
+                animate = True
+
+        # computer move, started once the legal moves of the position are known
+        if (
+            moves_ready
+            and valid_moves
+            and not game_over
+            and not human_turn
+            and not move_made
+            and not worker.busy
+        ):
+            worker.search(gs, time_limit=think_time)
 
         if move_made:
             if animate:
-                animate_move(gs.move_log[-1], screen, gs.board, clock)
-            valid_moves = gs.get_valid_moves()
+                renderer.animate_move(gs.move_log[-1], gs.board, clock)
+            valid_moves = []
+            moves_by_square = {}
+            moves_ready = False
+            worker.valid_moves(gs)
             move_made = False
             animate = False
 
-        draw_game_state(screen, gs, valid_moves, sq_selected)
-        if gs.checkmate:
+        # until the worker answers, checkmate and stalemate flags are still those of the previous position
+        text = None
+        if moves_ready and gs.checkmate:
             game_over = True
-            if gs.white_to_move:
-                draw_text(screen, "Black wins by checkmate")
-            else:
-                draw_text(screen, "White wins by checkmate")
-        elif gs.stalemate:
+            text = "Black wins by checkmate" if gs.white_to_move else "White wins by checkmate"
+        elif moves_ready and gs.stalemate:
             game_over = True
-            draw_text(screen, "Stalemate")
+            text = "Stalemate"
+        renderer.draw(gs, moves_by_square, sq_selected, promotion_choices, text)
 
-        clock.tick(MAX_FPS)
-        p.display.flip()
+    worker.close()  # the worker prints its own summary when it is profiled
+    if profile:
+        print("main process:", file=sys.stderr)
+        Profiler.summary()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Play chess against a human or the computer.")
+    parser.add_argument(
+        "--computer",
+        choices=("none", "white", "black", "both"),
+        default="none",
+        help="side(s) played by the computer",
+    )
+    parser.add_argument("--think-time", type=float, default=COMPUTER_THINK_TIME)
+    parser.add_argument("--fen", default=ChessEngine.START_FEN, help="starting position, also used by reset")
+    parser.add_argument("--profile", action="store_true", help="print the time spent in the engine on exit")
+    parser.add_argument("--book", help="Polyglot opening book (.bin) the computer plays from while it has moves")
+    parser.add_argument("--tablebases", help="directory of the KQK, KRK and KPK tables built by Chess.Tablebase")
+    args = parser.parse_args()
+    main(
+        white_human=args.computer not in ("white", "both"),
+        black_human=args.computer not in ("black", "both"),
+        think_time=args.think_time,
+        fen=args.fen,
+        profile=args.profile,
+        book=args.book,
+        tablebases=args.tablebases,
+    )
@@ -0,0 +1,111 @@
+"""
+Runs engine computation (legal moves, search, analysis) in a separate process so the pygame loop never waits on it.
+The UI submits a job with a snapshot of its GameState and polls for the result once per frame. Only the latest job
+is live: submitting a new one or calling cancel() makes a running search stop at its next budget check, and any
+result of a superseded job is dropped instead of being handed to the UI.
+"""
+
+import multiprocessing
+import pickle
+import queue
+import sys
+
+from Chess import MoveCache, Polyglot, Profiler, Searcher, Tablebase, TranspositionTable
+
+VALID_MOVES = "valid_moves"
+SEARCH = "search"
+INFO = "info"  # intermediate result of a search, one per finished iteration
+
+
+def worker_loop(jobs, results, active_job, profile=False, book_path=None, tablebase_dir=None):
+    # runs in the worker process, keeps one transposition table and move cache warm for the whole session
+    if profile:
+        Profiler.enable()
+    book = Polyglot.OpeningBook(book_path) if book_path else None  # memory-mapped, nothing is read up front
+    tablebase = Tablebase.Tablebase(tablebase_dir) if tablebase_dir else None
+    transposition_table = TranspositionTable.TranspositionTable()
+    move_cache = MoveCache.MoveCache()  # undo and reset revisit positions the UI has already seen
+    while True:
+        job = jobs.get()
+        if job is None:
+            if profile:
+                print("engine worker:", file=sys.stderr)
+                Profiler.summary()
+            break
+        job_id, kind, snapshot, options = job
+        if active_job.value != job_id:  # cancelled before it started
+            continue
+        gs = pickle.loads(snapshot)
+        if kind == VALID_MOVES:
+            moves = move_cache.get_valid_moves(gs)
+            results.put((job_id, kind, (moves, gs.in_check, gs.checkmate, gs.stalemate)))
+        elif kind == SEARCH:
+            searcher = Searcher.Searcher(
+                should_stop=lambda: active_job.value != job_id,
+                transposition_table=transposition_table,
+                book=book,
+                tablebase=tablebase,
+                info=(lambda result: results.put((job_id, INFO, result))) if options.get("analyse") else None,
+                **{key: value for key, value in options.items() if key != "analyse"}
+            )
+            results.put((job_id, kind, searcher.search(gs)))
+
+
+class EngineWorker:
+    def __init__(self, profile=False, book_path=None, tablebase_dir=None):
+        self.jobs = multiprocessing.Queue()
+        self.results = multiprocessing.Queue()
+        self.active_job = multiprocessing.Value("i", 0)
+        self.job_id = 0
+        self.kind = None  # kind of the job in flight, None when idle
+        self.process = multiprocessing.Process(
+            target=worker_loop,
+            args=(self.jobs, self.results, self.active_job, profile, book_path, tablebase_dir),
+            daemon=True,
+        )
+        self.process.start()
+
+    @property
+    def busy(self):
+        return self.kind is not None
+
+    def submit(self, kind, gs, **options):
+        # the snapshot is pickled here, so the caller can keep moving pieces on gs right away
+        snapshot = pickle.dumps(gs)
+        self.job_id += 1
+        self.active_job.value = self.job_id
+        self.kind = kind
+        self.jobs.put((self.job_id, kind, snapshot, options))
+        return self.job_id
+
+    def valid_moves(self, gs):
+        return self.submit(VALID_MOVES, gs)
+
+    def search(self, gs, time_limit=None, node_limit=None, max_depth=64, analyse=False):
+        return self.submit(
+            SEARCH, gs, time_limit=time_limit, node_limit=node_limit, max_depth=max_depth, analyse=analyse
+        )
+
+    def cancel(self):
+        self.active_job.value = 0
+        self.kind = None
+
+    def poll(self):
+        # returns (kind, result) of the live job without blocking, None if nothing arrived yet
+        while True:
+            try:
+                job_id, kind, result = self.results.get_nowait()
+            except queue.Empty:
+                return None
+            if job_id != self.job_id or self.kind is None:
+                continue  # result of a cancelled or superseded job
+            if kind != INFO:
+                self.kind = None
+            return kind, result
+
+    def close(self):
+        self.cancel()
+        self.jobs.put(None)
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
@@ -0,0 +1,106 @@
+"""
+Streaming reader for EPD (and plain FEN) files. Lines are parsed one at a time as the file is iterated, so memory
+stays flat however many positions the file holds. Each line becomes an EpdRecord with the position as a FEN string
+and its operations ("bm", "id", "c0", ...); a GameState is only built when asked for with record.game_state(), which
+is what takes the time when loading positions.
+
+    python -m Chess.Epd positions.epd
+    python -m Chess.Epd positions.epd --game-states --backend board
+"""
+
+import argparse
+import re
+import sys
+import time
+
+from Chess import ChessEngine
+
+# operation code followed by its operands (quoted strings may hold spaces and semicolons) up to the semicolon
+OPERATION = re.compile(r'\s*([A-Za-z][A-Za-z0-9_]*)((?:\s+(?:"[^"]*"|[^\s;"]+))*)\s*;')
+OPERAND = re.compile(r'"([^"]*)"|([^\s"]+)')
+
+
+class EpdRecord:
+    __slots__ = ("fen", "operations")
+
+    def __init__(self, fen, operations):
+        self.fen = fen
+        self.operations = operations  # operation code: list of operands
+
+    def game_state(self, **options):
+        # options are passed on to GameState.from_fen
+        return ChessEngine.GameState.from_fen(self.fen, **options)
+
+    def __repr__(self):
+        return "EpdRecord(%r, %r)" % (self.fen, self.operations)
+
+
+def parse_operations(text):
+    operations = {}
+    for match in OPERATION.finditer(text):
+        operations[match.group(1)] = [quoted or bare for quoted, bare in OPERAND.findall(match.group(2))]
+    return operations
+
+
+def parse_line(line):
+    # returns None for blank lines and comments
+    line = line.strip()
+    if not line or line[0] == "#":
+        return None
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError("EPD line needs at least 4 fields: %r" % line)
+    rest = fields[4] if len(fields) == 5 else ""
+    clocks = rest.split(None, 2)
+    if len(clocks) >= 2 and clocks[0].isdigit() and clocks[1].isdigit():
+        # a FEN line, the move counters take the place of the operations
+        return EpdRecord(" ".join(fields[:4] + clocks[:2]), parse_operations(clocks[2]) if len(clocks) == 3 else {})
+    operations = parse_operations(rest) if rest else {}
+    halfmove_clock = operations.get("hmvc", ["0"])[0]
+    fullmove_number = operations.get("fmvn", ["1"])[0]
+    return EpdRecord(" ".join(fields[:4]) + " " + halfmove_clock + " " + fullmove_number, operations)
+
+
+def read_epd(source):
+    # source is a path or an open text file, records are yielded lazily in file order
+    if isinstance(source, str):
+        with open(source) as f:
+            yield from read_epd(f)
+        return
+    for line_number, line in enumerate(source, 1):
+        try:
+            record = parse_line(line)
+        except ValueError as e:
+            raise ValueError("line %d: %s" % (line_number, e)) from None
+        if record is not None:
+            yield record
+
+
+def read_positions(source, **options):
+    # GameStates of every record, options are passed on to GameState.from_fen
+    for record in read_epd(source):
+        yield record.game_state(**options)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream an EPD or FEN file and report how fast it loads.")
+    parser.add_argument("path")
+    parser.add_argument("--game-states", action="store_true", help="also build a GameState for every record")
+    parser.add_argument("--backend", choices=("bitboard", "board"), default="bitboard")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    count = 0
+    if args.game_states:
+        for _ in read_positions(args.path, use_bitboards=args.backend == "bitboard"):
+            count += 1
+    else:
+        for _ in read_epd(args.path):
+            count += 1
+    elapsed = time.perf_counter() - start
+    print("%d positions in %.3fs, %d positions/s" % (count, elapsed, count / elapsed if elapsed > 0 else 0))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
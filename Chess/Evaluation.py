@@ -0,0 +1,122 @@
+"""
+Static evaluation: material plus piece-square tables. Every (piece, square) pair has one score, positive for white
+and negative for black, and the evaluation of a position is their sum. GameState keeps it up to date in
+make_move/undo_move by adding only what the move changed, the same way as the Zobrist key, so the search reads it
+at every leaf without looking at the board. compute_score adds it up from scratch and is what the incremental score
+is checked against in debug mode.
+
+The tables are written from white's point of view with the 8th rank first, the order of GameState.board, and black
+uses them flipped top to bottom.
+"""
+
+from Chess import Bitboard
+
+PIECE_VALUES = {"p": 100, "N": 320, "B": 330, "R": 500, "Q": 900, "K": 0}
+PIECE_SQUARE_TABLES = {
+    "p": (
+        0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ),
+    "N": (
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50,
+    ),
+    "B": (
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20,
+    ),
+    "R": (
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        0, 0, 0, 5, 5, 0, 0, 0,
+    ),
+    "Q": (
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20,
+    ),
+    "K": (
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        20, 30, 10, 0, 0, 10, 30, 20,
+    ),
+}
+
+
+def square_scores(piece):
+    # material plus table score of the piece on each square, signed for white
+    table = PIECE_SQUARE_TABLES[piece[1]]
+    value = PIECE_VALUES[piece[1]]
+    if piece[0] == "w":
+        return tuple(value + table[sq] for sq in range(64))
+    return tuple(-value - table[sq ^ 56] for sq in range(64))
+
+
+SQUARE_SCORES = {piece: square_scores(piece) for piece in Bitboard.PIECES}
+SQUARE_SCORES["--"] = (0,) * 64
+
+
+def move_delta(move, piece_placed):
+    # change of the score made by the move, added by make_move and subtracted again by undo_move
+    start = move.packed & 63
+    end = (move.packed >> 6) & 63
+    delta = SQUARE_SCORES[piece_placed][end] - SQUARE_SCORES[move.piece_moved][start]
+    if move.enpassant_move:
+        delta -= SQUARE_SCORES[move.piece_captured][(start & ~7) | (end & 7)]
+    else:
+        delta -= SQUARE_SCORES[move.piece_captured][end]
+    if move.castle:
+        rook = SQUARE_SCORES[move.piece_moved[0] + "R"]
+        if end > start:  # king side castle
+            delta += rook[end - 1] - rook[end + 1]
+        else:  # queen side castle
+            delta += rook[end + 1] - rook[end - 2]
+    return delta
+
+
+def compute_score(gs):
+    score = 0
+    sq = 0
+    for row in gs.board:
+        for piece in row:
+            score += SQUARE_SCORES[piece][sq]
+            sq += 1
+    return score
+
+
+def evaluate(gs):
+    # the score from the point of view of the side to move
+    return gs.evaluation if gs.white_to_move else -gs.evaluation
@@ -0,0 +1,51 @@
+"""
+Optional memoization of GameState.get_valid_moves. Results are keyed by GameState.position_key() (board, side to
+move, castling rights and en passant square), kept in least-recently-used order and evicted beyond max_size.
+Cached move lists are tuples shared by every caller, so they must not be modified. Hits, misses and evictions are
+counted to measure how often real workloads revisit positions.
+"""
+
+from collections import OrderedDict
+
+
+class MoveCache:
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        self.entries.clear()
+
+    def get_valid_moves(self, gs):
+        # same result and the same in_check/checkmate/stalemate flags on gs as gs.generate_valid_moves()
+        key = gs.position_key()
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            moves, gs.in_check, gs.checkmate, gs.stalemate = entry
+            return moves
+        self.misses += 1
+        moves = tuple(gs.generate_valid_moves())
+        self.entries[key] = (moves, gs.in_check, gs.checkmate, gs.stalemate)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return moves
@@ -0,0 +1,151 @@
+"""
+Perft (performance test) for the move generator. It walks the game tree of a position down to a fixed depth with
+get_valid_moves, make_move and undo_move and counts the leaves. The counts are compared with the known values of the
+standard reference positions below, and the time taken is reported as nodes/second so it doubles as a benchmark.
+
+    python -m Chess.Perft --position kiwipete --depth 3
+    python -m Chess.Perft --fen "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1" --depth 4 --backend board
+    python -m Chess.Perft --suite --depth 4
+"""
+
+import argparse
+import sys
+import time
+
+from Chess import ChessEngine, Profiler
+
+# name: (fen, leaf counts for depth 1, 2, 3, ...)
+# https://www.chessprogramming.org/Perft_Results
+REFERENCE_POSITIONS = {
+    "start": (
+        "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+        (20, 400, 8902, 197281, 4865609),
+    ),
+    "kiwipete": (
+        "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+        (48, 2039, 97862, 4085603),
+    ),
+    "position3": (
+        "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+        (14, 191, 2812, 43238, 674624),
+    ),
+    "position4": (
+        "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+        (6, 264, 9467, 422333),
+    ),
+    "position5": (
+        "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+        (44, 1486, 62379, 2103487),
+    ),
+    "position6": (
+        "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+        (46, 2079, 89890, 3894594),
+    ),
+}
+BACKENDS = ("bitboard", "board")
+
+
+def perft(gs, depth):
+    moves = gs.get_valid_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        gs.make_move(move)
+        nodes += perft(gs, depth - 1)
+        gs.undo_move()
+    return nodes
+
+
+def divide(gs, depth):
+    # leaf count below every root move, the first thing to diff against another engine when a count is off
+    counts = []
+    for move in gs.get_valid_moves():
+        gs.make_move(move)
+        counts.append((move.get_chess_notation(), perft(gs, depth - 1) if depth > 1 else 1))
+        gs.undo_move()
+    return counts
+
+
+def run(fen, depth, use_bitboards=True, expected=None, show_divide=True, debug=False, out=sys.stdout):
+    gs = ChessEngine.GameState.from_fen(fen, use_bitboards, debug)
+    start = time.perf_counter()
+    counts = divide(gs, depth)
+    elapsed = time.perf_counter() - start
+    nodes = sum(count for _, count in counts)
+    if show_divide:
+        for notation, count in sorted(counts):
+            print("  %s: %d" % (notation, count), file=out)
+    status = ""
+    if expected is not None:
+        status = " (expected %d, %s)" % (expected, "OK" if nodes == expected else "FAIL")
+    print("depth %d: %d nodes%s" % (depth, nodes, status), file=out)
+    print(
+        "time %.3fs, %d nodes/s" % (elapsed, nodes / elapsed if elapsed > 0 else 0),
+        file=out,
+    )
+    return nodes, elapsed
+
+
+def run_suite(max_depth, use_bitboards=True, debug=False, out=sys.stdout):
+    # every reference position at every known depth up to max_depth, returns False on any mismatch
+    all_ok = True
+    total_nodes = 0
+    total_time = 0.0
+    for name, (fen, counts) in REFERENCE_POSITIONS.items():
+        print("%s: %s" % (name, fen), file=out)
+        for depth, expected in enumerate(counts[:max_depth], 1):
+            nodes, elapsed = run(fen, depth, use_bitboards, expected, False, debug, out)
+            all_ok = all_ok and nodes == expected
+            total_nodes += nodes
+            total_time += elapsed
+    print(
+        "suite %s: %d nodes in %.3fs, %d nodes/s"
+        % (
+            "OK" if all_ok else "FAILED",
+            total_nodes,
+            total_time,
+            total_nodes / total_time if total_time > 0 else 0,
+        ),
+        file=out,
+    )
+    return all_ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count and time move generation to a fixed depth.")
+    position = parser.add_mutually_exclusive_group()
+    position.add_argument("--position", choices=sorted(REFERENCE_POSITIONS), default="start")
+    position.add_argument("--fen", help="any position in FEN instead of a reference position")
+    position.add_argument("--suite", action="store_true", help="run every reference position")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--backend", choices=BACKENDS, default="bitboard")
+    parser.add_argument(
+        "--debug",
+        action="store_true",
+        help="check the incremental zobrist key against a full recomputation after every move",
+    )
+    parser.add_argument("--profile", action="store_true", help="print the time spent in each GameState method")
+    args = parser.parse_args(argv)
+    use_bitboards = args.backend == "bitboard"
+
+    if args.profile:
+        Profiler.enable()
+    try:
+        if args.suite:
+            return 0 if run_suite(args.depth, use_bitboards, args.debug) else 1
+        if args.fen:
+            fen, expected = args.fen, None
+        else:
+            fen, counts = REFERENCE_POSITIONS[args.position]
+            expected = counts[args.depth - 1] if args.depth <= len(counts) else None
+        print(fen)
+        nodes, _ = run(fen, args.depth, use_bitboards, expected, debug=args.debug)
+        return 0 if expected is None or nodes == expected else 1
+    finally:
+        if args.profile:
+            Profiler.summary()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,344 @@
+"""
+Streaming PGN reader and writer. read_games() parses a PGN file one game at a time (tags and SAN movetext, with
+comments, variations and NAGs skipped), so memory stays flat on databases of any size. replay_games() resolves every
+SAN move against GameState.get_valid_moves, plays it with make_move and yields one ReplayResult per game, which is
+how a database is validated. Games are written back with format_game()/write_games(), and game_from_state() turns
+the move log of a GameState into a PgnGame.
+
+    python -m Chess.Pgn games.pgn
+    python -m Chess.Pgn games.pgn --output checked.pgn --backend board
+"""
+
+import argparse
+import re
+import sys
+import time
+
+from Chess import ChessEngine, Profiler
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+SEVEN_TAG_ROSTER = ("Event", "Site", "Date", "Round", "White", "Black", "Result")
+TAG = re.compile(r'\[\s*([A-Za-z0-9_]+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+TOKEN = re.compile(r"[{};()]|[^\s{};()]+")
+MOVE_NUMBER = re.compile(r"^\d+\.*")
+SAN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$")
+LINE_LENGTH = 80
+
+
+class PgnGame:
+    __slots__ = ("tags", "moves", "result")
+
+    def __init__(self, tags=None, moves=None, result="*"):
+        self.tags = tags if tags is not None else {}
+        self.moves = moves if moves is not None else []  # SAN strings
+        self.result = result
+
+    @property
+    def start_fen(self):
+        return self.tags.get("FEN", ChessEngine.START_FEN)
+
+    def __repr__(self):
+        return "PgnGame(%s vs %s, %d plies, %s)" % (
+            self.tags.get("White", "?"),
+            self.tags.get("Black", "?"),
+            len(self.moves),
+            self.result,
+        )
+
+
+class ReplayResult:
+    __slots__ = ("number", "game", "gs", "error")
+
+    def __init__(self, number, game, gs, error):
+        self.number = number  # 1 for the first game of the file
+        self.game = game
+        self.gs = gs  # final position, None when the game could not be replayed
+        self.error = error  # None for a valid game, otherwise the reason it is not
+
+
+def read_games(source):
+    # source is a path or an open text file, games are yielded lazily in file order
+    if isinstance(source, str):
+        with open(source, encoding="utf-8", errors="replace") as f:
+            yield from read_games(f)
+        return
+    game = PgnGame()
+    in_comment = False
+    variation_depth = 0
+    for line in source:
+        if in_comment:
+            end = line.find("}")
+            if end < 0:
+                continue
+            in_comment = False
+            line = line[end + 1:]
+        elif line.startswith("%"):  # escape mechanism, the rest of the line is ignored
+            continue
+        elif line.lstrip().startswith("["):
+            match = TAG.match(line.strip())
+            if match:
+                if game.moves:  # the previous game ended without a result
+                    yield game
+                    game = PgnGame()
+                game.tags[match.group(1)] = match.group(2).replace('\\"', '"').replace("\\\\", "\\")
+                continue
+        pos = 0
+        while True:
+            match = TOKEN.search(line, pos)
+            if match is None:
+                break
+            token = match.group()
+            pos = match.end()
+            if token == "{":
+                end = line.find("}", pos)
+                if end < 0:
+                    in_comment = True
+                    break
+                pos = end + 1
+            elif token == ";":
+                break
+            elif token == "(":
+                variation_depth += 1
+            elif token == ")":
+                variation_depth = max(0, variation_depth - 1)
+            elif variation_depth or token[0] == "$" or token == "e.p.":
+                continue
+            elif token in RESULTS:
+                game.result = token
+                yield game
+                game = PgnGame()
+                variation_depth = 0
+            else:
+                token = MOVE_NUMBER.sub("", token)
+                if token:
+                    game.moves.append(token)
+    if game.moves or game.tags:
+        yield game
+
+
+def parse_san(gs, san, moves):
+    # returns the move for the SAN string among the legal moves, raises ValueError
+    text = san.rstrip("+#!?")
+    if text.endswith("e.p."):
+        text = text[:-4]
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        end_col = 6 if len(text) == 3 else 2
+        for move in moves:
+            if move.castle and move.end_col == end_col:
+                return move
+        raise ValueError("illegal move %s" % san)
+    match = SAN.match(text)
+    if match is None:
+        raise ValueError("invalid SAN %r" % san)
+    piece, from_file, from_rank, to_square, promotion = match.groups()
+    piece = piece or "p"
+    end_row = ChessEngine.Move.ranks_to_rows[to_square[1]]
+    end_col = ChessEngine.Move.files_to_cols[to_square[0]]
+    from_col = ChessEngine.Move.files_to_cols[from_file] if from_file else None
+    from_row = ChessEngine.Move.ranks_to_rows[from_rank] if from_rank else None
+    candidates = [
+        move
+        for move in moves
+        if move.end_col == end_col
+        and move.end_row == end_row
+        and move.piece_moved[1] == piece
+        and not move.castle
+        and (from_col is None or move.start_col == from_col)
+        and (from_row is None or move.start_row == from_row)
+        and move.promotion_piece == promotion
+    ]
+    if not candidates:
+        raise ValueError("illegal move %s" % san)
+    if len(candidates) > 1:
+        raise ValueError("ambiguous move %s" % san)
+    return candidates[0]
+
+
+def move_to_san(gs, move, moves):
+    # moves are the legal moves of gs, the move is played and taken back to find check and mate
+    if move.castle:
+        san = "O-O" if move.end_col == 6 else "O-O-O"
+    else:
+        piece = move.piece_moved[1]
+        destination = move.get_rank_file(move.end_row, move.end_col)
+        capture = move.piece_captured != "--"
+        if piece == "p":
+            san = (ChessEngine.Move.cols_to_files[move.start_col] + "x" if capture else "") + destination
+            if move.pawn_promotion:
+                san += "=" + move.promotion_piece
+        else:
+            others = [
+                other
+                for other in moves
+                if other.piece_moved == move.piece_moved
+                and other.end_row == move.end_row
+                and other.end_col == move.end_col
+                and other.move_id != move.move_id
+            ]
+            disambiguation = ""
+            if others:
+                if all(other.start_col != move.start_col for other in others):
+                    disambiguation = ChessEngine.Move.cols_to_files[move.start_col]
+                elif all(other.start_row != move.start_row for other in others):
+                    disambiguation = ChessEngine.Move.rows_to_ranks[move.start_row]
+                else:
+                    disambiguation = move.get_rank_file(move.start_row, move.start_col)
+            san = piece + disambiguation + ("x" if capture else "") + destination
+    flags = (gs.in_check, gs.checkmate, gs.stalemate)
+    gs.make_move(move)
+    try:
+        replies = gs.get_valid_moves()
+        if gs.in_check:
+            san += "+" if replies else "#"
+    finally:
+        gs.undo_move()
+        gs.in_check, gs.checkmate, gs.stalemate = flags
+    return san
+
+
+def replay(game, use_bitboards=True):
+    # plays the game from its start position and returns the final GameState, raises ValueError at the first bad move
+    gs = ChessEngine.GameState.from_fen(game.start_fen, use_bitboards)
+    for ply, san in enumerate(game.moves):
+        moves = gs.get_valid_moves()
+        try:
+            move = parse_san(gs, san, moves)
+        except ValueError as e:
+            raise ValueError("move %d%s %s" % (ply // 2 + 1, "." if gs.white_to_move else "...", e)) from None
+        gs.make_move(move)
+    gs.get_valid_moves()  # sets checkmate/stalemate of the final position
+    return gs
+
+
+def replay_games(source, use_bitboards=True):
+    for number, game in enumerate(read_games(source), 1):
+        try:
+            gs = replay(game, use_bitboards)
+        except ValueError as e:
+            yield ReplayResult(number, game, None, str(e))
+        else:
+            yield ReplayResult(number, game, gs, None)
+
+
+def game_from_state(gs, tags=None, result=None):
+    # the moves of gs.move_log as a PgnGame, gs is walked back to its start position and forward again
+    played = gs.move_log[:]
+    while gs.move_log:
+        gs.undo_move()
+    start_fen = gs.to_fen()
+    sans = []
+    for move in played:
+        sans.append(move_to_san(gs, move, gs.get_valid_moves()))
+        gs.make_move(move)
+    gs.get_valid_moves()
+    if result is None:
+        if gs.checkmate:
+            result = "0-1" if gs.white_to_move else "1-0"
+        elif gs.stalemate:
+            result = "1/2-1/2"
+        else:
+            result = "*"
+    game = PgnGame(dict(tags or {}), sans, result)
+    if start_fen != ChessEngine.START_FEN:
+        game.tags["SetUp"] = "1"
+        game.tags["FEN"] = start_fen
+    return game
+
+
+def format_game(game):
+    tags = dict(game.tags)
+    tags["Result"] = game.result
+    lines = []
+    for name in SEVEN_TAG_ROSTER:
+        lines.append('[%s "%s"]' % (name, tags.pop(name, "?").replace("\\", "\\\\").replace('"', '\\"')))
+    for name, value in tags.items():
+        lines.append('[%s "%s"]' % (name, value.replace("\\", "\\\\").replace('"', '\\"')))
+    lines.append("")
+
+    # the move number of the first move comes from the start position
+    fields = game.start_fen.split()
+    white_to_move = len(fields) < 2 or fields[1] == "w"
+    number = int(fields[5]) if len(fields) >= 6 else 1
+    tokens = []
+    for i, san in enumerate(game.moves):
+        if white_to_move:
+            tokens.append("%d. %s" % (number, san))
+        elif i == 0:
+            tokens.append("%d... %s" % (number, san))
+        else:
+            tokens.append(san)
+        if not white_to_move:
+            number += 1
+        white_to_move = not white_to_move
+    tokens.append(game.result)
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > LINE_LENGTH:
+            lines.append(line)
+            line = token
+        else:
+            line = line + " " + token if line else token
+    lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def write_games(games, target):
+    # target is a path or an open text file, games may be any iterable (a generator is written as it goes)
+    if isinstance(target, str):
+        with open(target, "w", encoding="utf-8") as f:
+            return write_games(games, f)
+    count = 0
+    for game in games:
+        if count:
+            target.write("\n")
+        target.write(format_game(game))
+        count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay every game of a PGN file and report how fast it goes.")
+    parser.add_argument("path")
+    parser.add_argument("--backend", choices=("bitboard", "board"), default="bitboard")
+    parser.add_argument("--output", help="write the games that replayed without error to this PGN file")
+    parser.add_argument("--profile", action="store_true", help="print the time spent in each GameState method")
+    args = parser.parse_args(argv)
+    if args.profile:
+        Profiler.enable()
+
+    games = plies = errors = 0
+    start = time.perf_counter()
+    output = open(args.output, "w", encoding="utf-8") if args.output else None
+    try:
+        for result in replay_games(args.path, args.backend == "bitboard"):
+            games += 1
+            if result.error is not None:
+                errors += 1
+                print("game %d (%r): %s" % (result.number, result.game, result.error))
+                continue
+            plies += len(result.game.moves)
+            if output is not None:
+                write_games([result.game], output)
+                output.write("\n")
+    finally:
+        if output is not None:
+            output.close()
+    elapsed = time.perf_counter() - start
+    print(
+        "%d games (%d invalid), %d plies in %.3fs, %.1f games/s, %d plies/s"
+        % (
+            games,
+            errors,
+            plies,
+            elapsed,
+            games / elapsed if elapsed > 0 else 0,
+            plies / elapsed if elapsed > 0 else 0,
+        )
+    )
+    if args.profile:
+        Profiler.summary()
+    return 0 if errors == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
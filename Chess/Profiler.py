@@ -0,0 +1,110 @@
+"""
+Opt-in instrumentation of the GameState hot paths. enable() replaces the methods in METHODS on the GameState class
+with wrappers that count the calls and add up the time spent in them (including the methods they call), disable()
+puts the originals back, so there is no cost at all while profiling is off. move_functions holds bound methods, so
+only GameStates created after enable() have their piece generators timed.
+
+    Profiler.enable()
+    ...
+    Profiler.summary()
+
+The entry points take a --profile flag that does this around their work:
+
+    python -m Chess.Perft --suite --depth 3 --profile
+    python -m Chess.BatchAnalysis positions.epd --depth 3 --profile
+"""
+
+import functools
+import sys
+import time
+
+from Chess import ChessEngine
+
+METHODS = (
+    "get_valid_moves",
+    "generate_valid_moves",
+    "check_for_pins_and_checks",
+    "square_under_attack",
+    "is_square_attacked",
+    "get_all_possible_moves",
+    # move_functions
+    "get_pawn_moves",
+    "get_rook_moves",
+    "get_knight_moves",
+    "get_bishop_moves",
+    "get_queen_moves",
+    "get_king_moves",
+    "get_castle_moves",
+    # bitboard backend
+    "get_bitboard_valid_moves",
+    "get_bitboard_context",
+    "get_bitboard_moves",
+    "get_bitboard_pawn_moves",
+    "get_bitboard_castle_moves",
+    "make_move",
+    "undo_move",
+)
+
+originals = {}  # method name: the plain function, filled while profiling is enabled
+stats = {}  # method name: [calls, seconds]
+
+
+def timed(name, function):
+    stat = stats.setdefault(name, [0, 0.0])
+    perf_counter = time.perf_counter
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            stat[0] += 1
+            stat[1] += perf_counter() - start
+
+    return wrapper
+
+
+def enabled():
+    return bool(originals)
+
+
+def enable():
+    if originals:
+        return
+    for name in METHODS:
+        function = getattr(ChessEngine.GameState, name)
+        originals[name] = function
+        setattr(ChessEngine.GameState, name, timed(name, function))
+
+
+def disable():
+    for name, function in originals.items():
+        setattr(ChessEngine.GameState, name, function)
+    originals.clear()
+
+
+def reset():
+    for stat in stats.values():
+        stat[0] = 0
+        stat[1] = 0.0
+
+
+def snapshot():
+    # {method name: (calls, seconds)} of the methods called since the last reset
+    return {name: (calls, seconds) for name, (calls, seconds) in stats.items() if calls}
+
+
+def merge(total, other):
+    # adds the snapshot other into total, for snapshots taken in several processes
+    for name, (calls, seconds) in other.items():
+        total_calls, total_seconds = total.get(name, (0, 0.0))
+        total[name] = (total_calls + calls, total_seconds + seconds)
+    return total
+
+
+def summary(snapshot_stats=None, out=sys.stderr):
+    snapshot_stats = snapshot() if snapshot_stats is None else snapshot_stats
+    print("%-28s %12s %12s %14s" % ("method", "calls", "total s", "per call us"), file=out)
+    for name, (calls, seconds) in sorted(snapshot_stats.items(), key=lambda item: -item[1][1]):
+        print("%-28s %12d %12.3f %14.2f" % (name, calls, seconds, seconds / calls * 1e6), file=out)
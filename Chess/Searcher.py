@@ -0,0 +1,288 @@
+"""
+Computer opponent. Searcher runs a negamax alpha-beta search with iterative deepening on top of
+GameState.get_valid_moves/make_move/undo_move, under a hard time and/or node budget. The best move of the last
+finished iteration is returned together with its score, the depth reached and the search counters (nodes,
+nodes/second, cutoffs...), which are what we tune the engine on.
+"""
+
+import time
+
+from Chess import ChessEngine, Evaluation, TranspositionTable
+
+PIECE_VALUES = Evaluation.PIECE_VALUES
+MATE_SCORE = 100000
+INFINITY = MATE_SCORE + 1
+
+
+def move_order_key(move):
+    # most valuable victim / least valuable attacker, captures and promotions before quiet moves
+    score = 0
+    if move.piece_captured != "--":
+        score += 10 * PIECE_VALUES[move.piece_captured[1]] - PIECE_VALUES[move.piece_moved[1]] + 10000
+    if move.pawn_promotion:
+        score += PIECE_VALUES[move.promotion_piece]
+    return -score
+
+
+def sort_moves(moves, hash_move=-1):
+    # returns a new list, get_valid_moves may hand out a cached tuple
+    # hash_move is the packed best move from the transposition table, it is searched before everything else
+    moves = sorted(moves, key=move_order_key)
+    if hash_move > 0:
+        for i, move in enumerate(moves):
+            if move.packed == hash_move:
+                moves.insert(0, moves.pop(i))
+                break
+    return moves
+
+
+def score_to_table(score, ply):
+    # mate scores are stored relative to the position, not to the root
+    if score >= MATE_SCORE - 1000:
+        return score + ply
+    if score <= -MATE_SCORE + 1000:
+        return score - ply
+    return score
+
+
+def score_from_table(score, ply):
+    if score >= MATE_SCORE - 1000:
+        return score - ply
+    if score <= -MATE_SCORE + 1000:
+        return score + ply
+    return score
+
+
+class SearchAborted(Exception):
+    pass
+
+
+class SearchResult:
+    def __init__(self, best_move, score, depth, nodes, elapsed):
+        self.best_move = best_move
+        self.score = score
+        self.depth = depth
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.nodes_per_second = nodes / elapsed if elapsed > 0 else 0.0
+
+    def __repr__(self):
+        return "SearchResult(best_move=%s, score=%d, depth=%d, nodes=%d, nodes_per_second=%d)" % (
+            self.best_move.get_chess_notation() if self.best_move else None,
+            self.score,
+            self.depth,
+            self.nodes,
+            self.nodes_per_second,
+        )
+
+
+class Searcher:
+    def __init__(
+        self,
+        max_depth=64,
+        time_limit=None,
+        node_limit=None,
+        info=None,
+        should_stop=None,
+        transposition_table=None,
+        tt_size_mb=16,
+        tt_policy="depth",
+        book=None,
+        book_selection="weighted",
+        tablebase=None,
+    ):
+        self.max_depth = max_depth
+        self.time_limit = time_limit  # seconds, None for no limit
+        self.node_limit = node_limit  # None for no limit
+        self.info = info  # called with a SearchResult after every finished iteration
+        self.should_stop = should_stop  # polled with the time budget, returning True aborts the search
+        # kept between searches, pass one in to share it or size it with tt_size_mb/tt_policy; 0 MB disables it
+        if transposition_table is None and tt_size_mb:
+            transposition_table = TranspositionTable.TranspositionTable(tt_size_mb, tt_policy)
+        self.transposition_table = transposition_table
+        self.book = book  # a Polyglot.OpeningBook, its moves are played without searching
+        self.book_selection = book_selection
+        self.tablebase = tablebase  # a Tablebase.Tablebase, the positions it covers are scored without searching
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.nodes = 0  # every position entered, including quiescence
+        self.quiescence_nodes = 0
+        self.evaluations = 0
+        self.beta_cutoffs = 0
+        self.tt_cutoffs = 0  # nodes answered straight from the transposition table
+        self.tablebase_hits = 0
+        self.depth = 0  # last fully searched depth
+        self.elapsed = 0.0
+        self.start_time = 0.0
+
+    @property
+    def nodes_per_second(self):
+        return self.nodes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def counters(self):
+        return {
+            "nodes": self.nodes,
+            "quiescence_nodes": self.quiescence_nodes,
+            "evaluations": self.evaluations,
+            "beta_cutoffs": self.beta_cutoffs,
+            "tt_cutoffs": self.tt_cutoffs,
+            "tablebase_hits": self.tablebase_hits,
+            "depth": self.depth,
+            "elapsed": self.elapsed,
+            "nodes_per_second": self.nodes_per_second,
+        }
+
+    def search(self, gs):
+        self.reset_counters()
+        self.start_time = time.perf_counter()
+        if self.transposition_table is not None:
+            self.transposition_table.new_search()
+        # the search calls get_valid_moves deep in the tree, keep the flags of the root position for the caller
+        root_flags = (gs.in_check, gs.checkmate, gs.stalemate)
+        root_moves = gs.get_valid_moves()
+        if self.book is not None and root_moves:
+            move = self.book.choose(gs, self.book_selection, root_moves)
+            if move is not None:
+                self.elapsed = time.perf_counter() - self.start_time
+                gs.in_check, gs.checkmate, gs.stalemate = root_flags
+                return SearchResult(move, 0, 0, 0, self.elapsed)
+        best_move = root_moves[0] if root_moves else None
+        best_score = 0
+        try:
+            if len(root_moves) > 1:
+                root_moves = sort_moves(root_moves)
+                for depth in range(1, self.max_depth + 1):
+                    move, score = self.search_root(gs, root_moves, depth)
+                    best_move, best_score = move, score
+                    self.depth = depth
+                    # search the best move first on the next iteration
+                    root_moves.remove(move)
+                    root_moves.insert(0, move)
+                    self.elapsed = time.perf_counter() - self.start_time
+                    if self.info is not None:
+                        self.info(SearchResult(best_move, best_score, depth, self.nodes, self.elapsed))
+                    if abs(score) >= MATE_SCORE - depth:  # forced mate found, no need to look deeper
+                        break
+        except SearchAborted:
+            pass
+        self.elapsed = time.perf_counter() - self.start_time
+        gs.in_check, gs.checkmate, gs.stalemate = root_flags
+        return SearchResult(best_move, best_score, self.depth, self.nodes, self.elapsed)
+
+    def search_root(self, gs, moves, depth):
+        alpha = -INFINITY
+        best_move = moves[0]
+        for move in moves:
+            gs.make_move(move)
+            try:
+                score = -self.negamax(gs, depth - 1, -INFINITY, -alpha, 1)
+            finally:
+                gs.undo_move()
+            if score > alpha:
+                alpha = score
+                best_move = move
+        if self.transposition_table is not None:
+            self.transposition_table.store(
+                gs.zobrist_key, depth, score_to_table(alpha, 0), TranspositionTable.EXACT, best_move.packed
+            )
+        return best_move, alpha
+
+    def negamax(self, gs, depth, alpha, beta, ply):
+        if self.tablebase is not None:
+            probe = self.tablebase.probe(gs)
+            if probe is not None:
+                self.count_node()
+                self.tablebase_hits += 1
+                result, plies = probe  # result is 1, 0 or -1 for a win, draw or loss of the side to move
+                return result * (MATE_SCORE - ply - plies)
+        if depth == 0:
+            return self.quiescence(gs, alpha, beta)
+        self.count_node()
+        table = self.transposition_table
+        hash_move = -1
+        if table is not None:
+            entry = table.probe(gs.zobrist_key)
+            if entry is not None:
+                entry_depth, entry_score, bound, hash_move = entry
+                if entry_depth >= depth:
+                    entry_score = score_from_table(entry_score, ply)
+                    if (
+                        bound == TranspositionTable.EXACT
+                        or (bound == TranspositionTable.LOWER_BOUND and entry_score >= beta)
+                        or (bound == TranspositionTable.UPPER_BOUND and entry_score <= alpha)
+                    ):
+                        self.tt_cutoffs += 1
+                        return entry_score
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = None
+        # hash move, captures, promotions and quiet moves, a cutoff skips generating the later stages
+        for stage, moves in gs.get_move_stages(max(hash_move, 0)):
+            if stage == ChessEngine.CAPTURES:
+                moves.sort(key=move_order_key)
+            for move in moves:
+                gs.make_move(move)
+                try:
+                    score = -self.negamax(gs, depth - 1, -beta, -alpha, ply + 1)
+                finally:
+                    gs.undo_move()
+                if score > best_score:
+                    best_score = score
+                    best_move = move
+                if score >= beta:
+                    break
+                if score > alpha:
+                    alpha = score
+            if best_score >= beta:
+                self.beta_cutoffs += 1
+                break
+        if best_move is None:
+            return -MATE_SCORE + ply if gs.in_check else 0
+        if table is not None:
+            if best_score >= beta:
+                bound = TranspositionTable.LOWER_BOUND
+            elif best_score <= original_alpha:
+                bound = TranspositionTable.UPPER_BOUND
+            else:
+                bound = TranspositionTable.EXACT
+            table.store(gs.zobrist_key, depth, score_to_table(best_score, ply), bound, best_move.packed)
+        return best_score
+
+    def quiescence(self, gs, alpha, beta):
+        # only captures and promotions, so the static evaluation is never taken in the middle of an exchange
+        self.count_node()
+        self.quiescence_nodes += 1
+        self.evaluations += 1
+        stand_pat = Evaluation.evaluate(gs)  # kept up to date by make_move/undo_move
+        if stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+        # stops after the promotions, so the quiet moves are never generated
+        for stage, moves in gs.get_move_stages():
+            moves.sort(key=move_order_key)
+            for move in moves:
+                gs.make_move(move)
+                try:
+                    score = -self.quiescence(gs, -beta, -alpha)
+                finally:
+                    gs.undo_move()
+                if score >= beta:
+                    self.beta_cutoffs += 1
+                    return score
+                if score > alpha:
+                    alpha = score
+            if stage == ChessEngine.PROMOTIONS:
+                break
+        return alpha
+
+    def count_node(self):
+        self.nodes += 1
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            raise SearchAborted()
+        if self.nodes & 255 == 0:
+            if self.time_limit is not None and time.perf_counter() - self.start_time >= self.time_limit:
+                raise SearchAborted()
+            if self.should_stop is not None and self.should_stop():
+                raise SearchAborted()
@@ -0,0 +1,46 @@
+"""
+Piece sprites for the pygame front-end. The PNGs are read once from the images directory next to this module, so
+the game starts from any working directory, and converted to the display's pixel format. Scaled copies are built on
+first use for each (piece, square size) and the least recently used ones are dropped beyond max_size, so resizing
+the board never goes back to the disk.
+"""
+
+import os
+from collections import OrderedDict
+
+import pygame as p
+
+IMAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")
+PIECES = ("wp", "wR", "wN", "wB", "wQ", "wK", "bp", "bR", "bN", "bB", "bQ", "bK")
+
+
+class SpriteCache:
+    def __init__(self, max_size=48):
+        self.max_size = max_size  # scaled sprites kept, 48 holds every piece at 4 square sizes
+        self.originals = {}
+        self.scaled = OrderedDict()
+        self.evictions = 0
+
+    def load(self):
+        # needs a display mode, convert_alpha() matches the sprites to its pixel format
+        for piece in PIECES:
+            if piece not in self.originals:
+                self.originals[piece] = p.image.load(os.path.join(IMAGES_DIR, piece + ".png")).convert_alpha()
+
+    def get(self, piece, size):
+        key = (piece, size)
+        sprite = self.scaled.get(key)
+        if sprite is not None:
+            self.scaled.move_to_end(key)
+            return sprite
+        if piece not in self.originals:
+            self.load()
+        sprite = p.transform.smoothscale(self.originals[piece], (size, size))
+        self.scaled[key] = sprite
+        if len(self.scaled) > self.max_size:
+            self.scaled.popitem(last=False)
+            self.evictions += 1
+        return sprite
+
+    def clear(self):
+        self.scaled.clear()
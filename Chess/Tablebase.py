@@ -0,0 +1,284 @@
+"""
+Endgame tablebases for KQK, KRK and KPK. generate() enumerates every position of an ending, plays its legal moves
+with GameState.get_valid_moves and solves the resulting move graph by retrograde analysis: checkmates are lost in 0
+plies, a position with a move into a position lost in n plies is won in n + 1, and one whose moves all lead to
+positions won within n plies is lost in n + 1. What is left is drawn. Moves that leave the ending (the lone piece
+is captured, the pawn promotes) take their value from KK (a draw) or from the table of the new ending.
+
+Positions are indexed with the stronger side as white. Pawnless endings put the white king in the a8-d8-d5 triangle
+by mirroring and flipping the board, KPK puts the pawn on the a-d files, so every table is (king or pawn squares) *
+64 * 64 * 2 bytes. A byte holds the plies to mate + 1, or 0 for a draw (and for impossible positions); the side to
+move wins when the plies are odd. Tables are saved as .npy files and Tablebase memory-maps them, so a probe is a few
+square transforms and one byte read.
+
+    python -m Chess.Tablebase --generate
+    python -m Chess.Tablebase --fen "8/8/8/4k3/8/8/8/3QK3 w - - 0 1"
+
+The search probes them with python -m Chess.ChessMain --computer black --tablebases Chess/tablebases.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from Chess import ChessEngine
+
+TABLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebases")
+TABLES = {"KQK": "Q", "KRK": "R", "KPK": "p"}  # name: piece of the stronger side, in the order they are built
+PROMOTION_TABLES = {"Q": "KQK", "R": "KRK"}  # the other promotions are a draw against a lone king
+
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+TRIANGLE = tuple(row * 8 + col for row in range(4) for col in range(row, 4))  # a8-d8-d5, 10 squares
+TRIANGLE_INDEX = {sq: i for i, sq in enumerate(TRIANGLE)}
+PAWN_SQUARES = tuple(row * 8 + col for row in range(1, 7) for col in range(4))  # ranks 7 to 2, files a-d
+PAWN_INDEX = {sq: i for i, sq in enumerate(PAWN_SQUARES)}
+
+
+def mirror_col(sq):
+    return sq ^ 7
+
+
+def mirror_row(sq):
+    return sq ^ 56
+
+
+def transpose(sq):
+    return (sq & 7) << 3 | sq >> 3
+
+
+def table_index(name, white_king, black_king, piece, white_to_move):
+    # index of a position with white as the stronger side, the squares are row * 8 + col
+    if TABLES[name] == "p":
+        if piece & 7 > 3:
+            white_king, black_king, piece = mirror_col(white_king), mirror_col(black_king), mirror_col(piece)
+        anchor = PAWN_INDEX[piece]
+        first, second = white_king, black_king
+    else:
+        if white_king & 7 > 3:
+            white_king, black_king, piece = mirror_col(white_king), mirror_col(black_king), mirror_col(piece)
+        if white_king >> 3 > 3:
+            white_king, black_king, piece = mirror_row(white_king), mirror_row(black_king), mirror_row(piece)
+        if white_king >> 3 > white_king & 7:
+            white_king, black_king, piece = transpose(white_king), transpose(black_king), transpose(piece)
+        anchor = TRIANGLE_INDEX[white_king]
+        first, second = black_king, piece
+    return ((anchor * 64 + first) * 64 + second) * 2 + (0 if white_to_move else 1)
+
+
+def decode_index(name, index):
+    # (white king, black king, piece, white to move) of an index
+    white_to_move = index & 1 == 0
+    index >>= 1
+    second = index & 63
+    first = index >> 6 & 63
+    anchor = index >> 12
+    if TABLES[name] == "p":
+        return first, second, PAWN_SQUARES[anchor], white_to_move
+    return TRIANGLE[anchor], first, second, white_to_move
+
+
+def table_size(name):
+    return (len(PAWN_SQUARES) if TABLES[name] == "p" else len(TRIANGLE)) * 64 * 64 * 2
+
+
+def position_fen(name, white_king, black_king, piece, white_to_move):
+    board = [["--"] * 8 for _ in range(8)]
+    board[white_king >> 3][white_king & 7] = "wK"
+    board[black_king >> 3][black_king & 7] = "bK"
+    board[piece >> 3][piece & 7] = "w" + TABLES[name]
+    ranks = []
+    for row in board:
+        rank = ""
+        empty = 0
+        for square in row:
+            if square == "--":
+                empty += 1
+                continue
+            if empty:
+                rank += str(empty)
+                empty = 0
+            rank += ChessEngine.FEN_SYMBOLS[square]
+        ranks.append(rank + (str(empty) if empty else ""))
+    return "/".join(ranks) + (" w - - 0 1" if white_to_move else " b - - 0 1")
+
+
+def generate(name, directory=TABLES_DIR, tables=None, verbose=False):
+    # builds and saves one table, tables holds the tables already built that its promotions lead to
+    tables = tables if tables is not None else {}
+    start = time.perf_counter()
+    size = table_size(name)
+    has_moves = np.zeros(size, np.bool_)
+    checkmated = np.zeros(size, np.bool_)
+    moves_left = np.zeros(size, np.int32)  # moves not (yet) known to lead to a position the opponent wins
+    edges = []  # (position, position after the move) inside the table
+    exits = []  # (position, plies of the position after the move) for moves that leave the ending and are decided
+    for index in range(size):
+        white_king, black_king, piece, white_to_move = decode_index(name, index)
+        if len({white_king, black_king, piece}) < 3:
+            continue
+        try:
+            gs = ChessEngine.GameState.from_fen(
+                position_fen(name, white_king, black_king, piece, white_to_move), use_bitboards=True
+            )
+        except ValueError:  # the side that just moved is in check
+            continue
+        moves = gs.get_valid_moves()
+        if not moves:
+            checkmated[index] = gs.checkmate
+            continue
+        has_moves[index] = True
+        moves_left[index] = len(moves)
+        for move in moves:
+            end = move.end_row * 8 + move.end_col
+            if move.piece_captured != "--":  # the lone king took the piece, KK
+                continue
+            if move.pawn_promotion:
+                promoted = PROMOTION_TABLES.get(move.promotion_piece)
+                if promoted is not None:
+                    code = int(tables[promoted][table_index(promoted, white_king, black_king, end, False)])
+                    if code:
+                        exits.append((index, code - 1))
+                continue
+            if move.piece_moved == "wK":
+                child = table_index(name, end, black_king, piece, False)
+            elif move.piece_moved == "bK":
+                child = table_index(name, white_king, end, piece, True)
+            else:
+                child = table_index(name, white_king, black_king, end, False)
+            edges.append((index, child))
+    if verbose:
+        print("%s: %d moves generated in %.1fs" % (name, len(edges) + len(exits), time.perf_counter() - start))
+
+    edges = np.array(edges, np.int32).reshape(-1, 2)
+    parents, children = edges[:, 0], edges[:, 1]
+    exits = np.array(exits, np.int32).reshape(-1, 2)
+    exit_parents, exit_plies = exits[:, 0], exits[:, 1]
+    plies = np.full(size, -1, np.int32)  # -1 until the position is decided
+    plies[checkmated] = 0
+    n = last = 0
+    while n <= last + 2:
+        n += 1
+        if n & 1:
+            # won: a move into a position lost in n - 1 plies
+            winners = np.concatenate((parents[plies[children] == n - 1], exit_parents[exit_plies == n - 1]))
+            winners = winners[plies[winners] == -1]
+            plies[winners] = n
+            found = len(winners)
+        else:
+            # lost: the last of the moves turned out to lead to a position won in n - 1 plies
+            np.subtract.at(moves_left, parents[plies[children] == n - 1], 1)
+            np.subtract.at(moves_left, exit_parents[exit_plies == n - 1], 1)
+            losers = np.flatnonzero((moves_left == 0) & (plies == -1) & has_moves)
+            plies[losers] = n
+            found = len(losers)
+        if found:
+            last = n
+    if last > 254:
+        raise ValueError("%s has mates in %d plies, more than a byte holds" % (name, last))
+    codes = np.where(plies >= 0, plies + 1, 0).astype(np.uint8)
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, name + ".npy"), codes)
+    if verbose:
+        won = np.count_nonzero((plies > 0) & (plies & 1 == 1))
+        lost = np.count_nonzero((plies >= 0) & (plies & 1 == 0))
+        print(
+            "%s: %d won, %d lost, longest mate %d plies, %.1fs"
+            % (name, won, lost, last, time.perf_counter() - start)
+        )
+    return codes
+
+
+def generate_all(directory=TABLES_DIR, verbose=False):
+    tables = {}
+    for name in TABLES:
+        tables[name] = generate(name, directory, tables, verbose)
+    return tables
+
+
+class Tablebase:
+    def __init__(self, directory=TABLES_DIR):
+        self.directory = directory
+        self.tables = {}  # name: memory-mapped codes, the endings whose file is missing are not probed
+        for name in TABLES:
+            path = os.path.join(directory, name + ".npy")
+            if os.path.exists(path):
+                self.tables[name] = np.load(path, mmap_mode="r")
+        # the piece of the stronger side: its table
+        self.pieces = {}
+        for name in self.tables:
+            self.pieces["w" + TABLES[name]] = name
+            self.pieces["b" + TABLES[name]] = name
+
+    def find_piece(self, gs):
+        # (piece, square) of the one piece besides the kings, None when the position has any other material
+        if gs.bitboards is not None:
+            bitboards = gs.bitboards
+            if bin(bitboards.occupied).count("1") != 3:
+                return None
+            for piece in self.pieces:
+                bb = bitboards.pieces[piece]
+                if bb:
+                    return piece, bb.bit_length() - 1
+            return None
+        found = None
+        sq = 0
+        for row in gs.board:
+            for piece in row:
+                if piece != "--" and piece[1] != "K":
+                    if found is not None:
+                        return None
+                    found = (piece, sq)
+                sq += 1
+        return found if found is not None and found[0] in self.pieces else None
+
+    def probe(self, gs):
+        # (WIN/DRAW/LOSS for the side to move, plies to mate) or None when no table covers the position
+        if not self.tables:
+            return None
+        found = self.find_piece(gs)
+        if found is None:
+            return None
+        piece, sq = found
+        name = self.pieces[piece]
+        white_king = gs.white_king_location[0] * 8 + gs.white_king_location[1]
+        black_king = gs.black_king_location[0] * 8 + gs.black_king_location[1]
+        white_to_move = gs.white_to_move
+        if piece[0] == "b":  # the tables have white as the stronger side, flip the board and the colors
+            white_king, black_king, sq = mirror_row(black_king), mirror_row(white_king), mirror_row(sq)
+            white_to_move = not white_to_move
+        code = int(self.tables[name][table_index(name, white_king, black_king, sq, white_to_move)])
+        if code == 0:
+            return DRAW, 0
+        plies = code - 1
+        return (WIN if plies & 1 else LOSS), plies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the KQK, KRK and KPK tablebases or probe a position.")
+    parser.add_argument("--directory", default=TABLES_DIR)
+    parser.add_argument("--generate", action="store_true", help="build every table into the directory")
+    parser.add_argument("--fen", help="position to look up")
+    args = parser.parse_args(argv)
+    if not args.generate and args.fen is None:
+        parser.error("give --generate and/or --fen")
+
+    if args.generate:
+        generate_all(args.directory, verbose=True)
+    if args.fen is not None:
+        probe = Tablebase(args.directory).probe(ChessEngine.GameState.from_fen(args.fen, use_bitboards=True))
+        if probe is None:
+            print("not in the tablebases")
+        else:
+            result, plies = probe
+            print({WIN: "win", DRAW: "draw", LOSS: "loss"}[result] + (" in %d plies" % plies if result else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
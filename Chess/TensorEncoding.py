@@ -0,0 +1,180 @@
+"""
+Positions as feature rows for training pipelines. A row holds FEATURES values: 12 planes of 64 squares with a 1 where
+the piece stands (in Bitboard.PIECES order, squares in the order of GameState.board), then the side to move (1 for
+white), the castling rights (white king side, white queen side, black king side, black queen side) and the file of
+the en passant square one-hot. piece_planes() views the first part as (n, 12, 8, 8).
+
+encode_game_states() and encode_fens() fill rows of any array of that width, a preallocated one or a .npy opened
+with create_memmap(); the boards go through the byte encoders of BatchEvaluation and the planes are set with one
+NumPy comparison per chunk, never square by square. decode() turns rows back into GameStates (the move counters are
+not encoded, they come back as 0 and 1).
+
+    python -m Chess.TensorEncoding positions.epd positions.npy
+    python -m Chess.TensorEncoding positions.epd positions.npy --dtype float32
+"""
+
+import argparse
+import itertools
+import sys
+import time
+
+import numpy as np
+
+from Chess import BatchEvaluation, ChessEngine, Epd
+
+PLANES = 12 * 64
+SIDE_TO_MOVE = PLANES
+CASTLING = SIDE_TO_MOVE + 1
+EN_PASSANT = CASTLING + 4
+FEATURES = EN_PASSANT + 8
+PLANE_CODES = np.arange(1, 13, dtype=np.int8)[:, None]  # piece code of each plane
+CASTLING_FEN = ("K", "Q", "k", "q")
+CHUNK_SIZE = 8192
+# FEN rank of 8 piece codes, the reverse of BatchEvaluation.rank_bytes
+CODE_SYMBOLS = {code: ChessEngine.FEN_SYMBOLS[piece] for piece, code in BatchEvaluation.PIECE_CODES.items() if code}
+RANK_FENS = {}
+
+
+def allocate(n, dtype=np.uint8):
+    return np.zeros((n, FEATURES), dtype)
+
+
+def create_memmap(path, n, dtype=np.uint8):
+    # a new .npy file of n rows, written through the returned array; np.load(path, mmap_mode="r") reads it back
+    return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(n, FEATURES))
+
+
+def piece_planes(rows):
+    return rows[:, :PLANES].reshape(len(rows), 12, 8, 8)
+
+
+def fill(out, offset, boards, white_to_move, castling, enpassant_files):
+    # writes the rows offset... of out, enpassant_files holds the file of the en passant square or -1
+    n = len(boards)
+    rows = out[offset:offset + n]
+    if len(rows) != n:
+        raise ValueError("%d positions do not fit in %d rows from row %d" % (n, len(out), offset))
+    for start in range(0, n, CHUNK_SIZE):
+        chunk = slice(start, start + CHUNK_SIZE)
+        planes = rows[chunk, :PLANES].reshape(-1, 12, 64)
+        planes[...] = boards[chunk, None, :] == PLANE_CODES
+    rows[:, SIDE_TO_MOVE] = white_to_move
+    rows[:, CASTLING:EN_PASSANT] = castling
+    rows[:, EN_PASSANT:] = enpassant_files[:, None] == np.arange(8)
+    return out
+
+
+def encode_game_states(game_states, out=None, offset=0, dtype=np.uint8):
+    # rows of the GameStates in out from row offset (a new array when out is None), returns out
+    game_states = list(game_states)
+    boards, white_to_move = BatchEvaluation.encode_game_states(game_states)
+    castling = np.array(
+        [
+            (rights.wks, rights.wqs, rights.bks, rights.bqs)
+            for rights in (gs.current_castling_right for gs in game_states)
+        ],
+        np.bool_,
+    ).reshape(-1, 4)
+    enpassant_files = np.array([gs.enpassant_possible[1] if gs.enpassant_possible else -1 for gs in game_states])
+    if out is None:
+        out = allocate(len(game_states), dtype)
+    return fill(out, offset, boards, white_to_move, castling, enpassant_files)
+
+
+def encode_fens(fens, out=None, offset=0, dtype=np.uint8):
+    # rows of FEN (or EPD) strings in out from row offset (a new array when out is None), returns out
+    fens = list(fens)
+    boards, white_to_move = BatchEvaluation.encode_fens(fens)
+    castling = np.zeros((len(fens), 4), np.bool_)
+    enpassant_files = np.full(len(fens), -1)
+    for i, fen in enumerate(fens):
+        fields = fen.split(None, 4)
+        if len(fields) < 4:
+            raise ValueError("FEN needs at least 4 fields: %r" % fen)
+        if fields[2] != "-":
+            castling[i] = [right in fields[2] for right in CASTLING_FEN]
+        if fields[3] != "-":
+            if fields[3][0] not in ChessEngine.Move.files_to_cols:
+                raise ValueError("invalid en passant square %r in FEN %r" % (fields[3], fen))
+            enpassant_files[i] = ChessEngine.Move.files_to_cols[fields[3][0]]
+    if out is None:
+        out = allocate(len(fens), dtype)
+    return fill(out, offset, boards, white_to_move, castling, enpassant_files)
+
+
+def rank_fen(codes):
+    rank = RANK_FENS.get(codes)
+    if rank is None:
+        rank = ""
+        empty = 0
+        for code in codes:
+            if not code:
+                empty += 1
+                continue
+            if empty:
+                rank += str(empty)
+                empty = 0
+            rank += CODE_SYMBOLS[code]
+        rank += str(empty) if empty else ""
+        if len(RANK_FENS) >= ChessEngine.FEN_RANKS_MAX_SIZE:
+            RANK_FENS.clear()
+        RANK_FENS[codes] = rank
+    return rank
+
+
+def decode_fens(rows):
+    # FEN strings of rows, raises ValueError when a square holds more than one piece
+    rows = np.asarray(rows)
+    fens = []
+    for start in range(0, len(rows), CHUNK_SIZE):
+        chunk = rows[start:start + CHUNK_SIZE]
+        planes = chunk[:, :PLANES].reshape(-1, 12, 64) != 0
+        if (planes.sum(axis=1) > 1).any():
+            raise ValueError("a square holds more than one piece")
+        boards = ((planes.argmax(axis=1) + 1) * planes.any(axis=1)).astype(np.int8).tobytes()
+        for i, row in enumerate(chunk):
+            board = boards[i * 64:i * 64 + 64]
+            placement = "/".join([rank_fen(board[r:r + 8]) for r in range(0, 64, 8)])
+            white_to_move = row[SIDE_TO_MOVE] != 0
+            castling = "".join([right for right, flag in zip(CASTLING_FEN, row[CASTLING:EN_PASSANT]) if flag])
+            enpassant = "-"
+            files = np.flatnonzero(row[EN_PASSANT:])
+            if len(files):
+                enpassant = ChessEngine.Move.cols_to_files[int(files[0])] + ("6" if white_to_move else "3")
+            fens.append("%s %s %s %s 0 1" % (placement, "w" if white_to_move else "b", castling or "-", enpassant))
+    return fens
+
+
+def decode(rows, **options):
+    # GameStates of rows, options are passed on to GameState.from_fen, which rejects rows that are no position
+    for fen in decode_fens(rows):
+        yield ChessEngine.GameState.from_fen(fen, **options)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Encode every position of an EPD/FEN file into a .npy file.")
+    parser.add_argument("path")
+    parser.add_argument("output")
+    parser.add_argument("--dtype", choices=("uint8", "float32"), default="uint8")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    count = sum(1 for _ in Epd.read_epd(args.path))
+    out = create_memmap(args.output, count, np.dtype(args.dtype))
+    records = Epd.read_epd(args.path)
+    offset = 0
+    while offset < count:
+        fens = [record.fen for record in itertools.islice(records, BatchEvaluation.CHUNK_SIZE)]
+        encode_fens(fens, out, offset)
+        offset += len(fens)
+    out.flush()
+    elapsed = time.perf_counter() - start
+    print(
+        "%d positions (%d features) in %.3fs, %d positions/s"
+        % (count, FEATURES, elapsed, count / elapsed if elapsed > 0 else 0)
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,381 @@
+"""
+Self-play matches between two engine configurations. Every opening of the suite is played twice, once with each
+engine as white, and the games run in parallel on a ProcessPoolExecutor whose workers keep one Searcher per engine
+(the transposition tables are cleared before every game). A game ends on checkmate or stalemate (as get_valid_moves
+reports them), threefold repetition, the fifty-move rule, insufficient material, a time forfeit or the ply limit.
+Finished games are written to a PGN file and the score of the first engine is reported as an Elo difference with a
+95% error margin. With --sprt the match stops as soon as the sequential probability ratio test accepts either
+hypothesis (elo0 or elo1); when the schedule runs out first the test is reported as undecided and the exit status is
+still 0. The PGN Round tag holds the pass over the openings (--rounds) and the Game tag the number of the game.
+
+Engines are given as name:option=value,... with the options depth, nodes, tt (MB), book (Polyglot .bin),
+selection (weighted or best book moves) and tablebases (directory). The time control is base+increment in seconds,
+each engine runs on its own clock and a search gets a share of what is left on it.
+
+    python -m Chess.Tournament --engine new:depth=3 --engine old:depth=2 --pgn match.pgn
+    python -m Chess.Tournament --engine a:nodes=20000 --engine b:nodes=10000 --tc 30+0.3 --rounds 10 --sprt 0 50
+"""
+
+import argparse
+import concurrent.futures
+import math
+import os
+import sys
+import time
+
+from Chess import ChessEngine, Epd, Pgn, Polyglot, Searcher, Tablebase
+
+OPENINGS = (
+    "r1bqkbnr/1ppp1ppp/p1n5/1B2p3/4P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 0 4",  # Ruy Lopez
+    "r1bqk1nr/pppp1ppp/2n5/2b1p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4",  # Italian
+    "rnbqkb1r/1p2pppp/p2p1n2/8/3NP3/2N5/PPP2PPP/R1BQKB1R w KQkq - 0 6",  # Sicilian Najdorf
+    "rnbqkb1r/ppp2ppp/4pn2/3p4/3PP3/2N5/PPP2PPP/R1BQKBNR w KQkq - 2 4",  # French
+    "rn1qkbnr/pp2pppp/2p5/5b2/3PN3/8/PPP2PPP/R1BQKBNR w KQkq - 1 5",  # Caro-Kann
+    "rnbqkb1r/ppp2ppp/4pn2/3p4/2PP4/2N5/PP2PPPP/R1BQKBNR w KQkq - 2 4",  # Queen's Gambit Declined
+    "rnbqkb1r/pp2pppp/2p2n2/3p4/2PP4/5N2/PP2PPPP/RNBQKB1R w KQkq - 2 4",  # Slav
+    "rnbqk2r/ppp1ppbp/3p1np1/8/2PPP3/2N5/PP3PPP/R1BQKBNR w KQkq - 0 5",  # King's Indian
+    "rnbqk2r/pppp1ppp/4pn2/8/1bPP4/2N5/PP2PPPP/R1BQKBNR w KQkq - 2 4",  # Nimzo-Indian
+    "rnbqkb1r/ppp2ppp/5n2/3pp3/2P5/2N3P1/PP1PPP1P/R1BQKBNR w KQkq - 0 4",  # English
+)
+ENGINE_OPTIONS = {"depth": int, "nodes": int, "tt": int, "book": str, "selection": str, "tablebases": str}
+MOVES_TO_GO = 30  # a search gets the time left on the clock divided by this, plus most of the increment
+MAX_PLIES = 400
+
+worker_searchers = {}  # engine name: Searcher, built once per pool worker
+
+
+class Engine:
+    __slots__ = ("name", "options")
+
+    def __init__(self, name, options=None):
+        self.name = name
+        self.options = options if options is not None else {}
+
+    def __repr__(self):
+        return "Engine(%r, %r)" % (self.name, self.options)
+
+
+class GameResult:
+    __slots__ = ("number", "white", "black", "result", "termination", "game")
+
+    def __init__(self, number, white, black, result, termination, game):
+        self.number = number  # 1 for the first game of the schedule
+        self.white = white  # engine names
+        self.black = black
+        self.result = result  # "1-0", "0-1" or "1/2-1/2"
+        self.termination = termination
+        self.game = game  # PgnGame
+
+
+def parse_engine(text):
+    # "name:option=value,..." as an Engine, raises ValueError
+    name, _, options_text = text.partition(":")
+    if not name:
+        raise ValueError("engine %r has no name" % text)
+    options = {}
+    for option in filter(None, options_text.split(",")):
+        key, _, value = option.partition("=")
+        if key not in ENGINE_OPTIONS or not value:
+            raise ValueError("invalid engine option %r, options are %s" % (option, ", ".join(ENGINE_OPTIONS)))
+        options[key] = ENGINE_OPTIONS[key](value)
+    if options.get("selection", "weighted") not in Polyglot.SELECTIONS:
+        raise ValueError("selection must be one of %s, not %r" % (Polyglot.SELECTIONS, options["selection"]))
+    return Engine(name, options)
+
+
+def parse_time_control(text):
+    # "base+increment" in seconds as (base, increment), raises ValueError
+    base, _, increment = text.partition("+")
+    try:
+        base, increment = float(base), float(increment or 0)
+    except ValueError:
+        raise ValueError("invalid time control %r, expected base+increment in seconds" % text) from None
+    if base <= 0 or increment < 0:
+        raise ValueError("invalid time control %r" % text)
+    return base, increment
+
+
+def searcher_for(engine):
+    searcher = worker_searchers.get(engine.name)
+    if searcher is None:
+        options = engine.options
+        searcher = Searcher.Searcher(
+            max_depth=options.get("depth", 64),
+            node_limit=options.get("nodes"),
+            tt_size_mb=options.get("tt", 16),
+            book=Polyglot.OpeningBook(options["book"]) if "book" in options else None,
+            book_selection=options.get("selection", "weighted"),
+            tablebase=Tablebase.Tablebase(options["tablebases"]) if "tablebases" in options else None,
+        )
+        worker_searchers[engine.name] = searcher
+    return searcher
+
+
+def insufficient_material(gs):
+    # bare kings, or a single bishop or knight against a bare king
+    minors = 0
+    for row in gs.board:
+        for piece in row:
+            if piece[1] in "pRQ":
+                return False
+            if piece[1] in "BN":
+                minors += 1
+    return minors <= 1
+
+
+def play_game(number, round_number, fen, white, black, time_control=None, max_plies=MAX_PLIES):
+    # runs in a pool worker, plays one game and returns its GameResult; round_number is the pass over the openings
+    gs = ChessEngine.GameState.from_fen(fen, use_bitboards=True)
+    searchers = {True: searcher_for(white), False: searcher_for(black)}
+    for searcher in searchers.values():
+        if searcher.transposition_table is not None:
+            searcher.transposition_table.clear()
+    clocks = {True: time_control[0], False: time_control[0]} if time_control else None
+    halfmove_clock = gs.fen_clocks[0]
+    repetitions = {gs.zobrist_key: 1}  # positions since the last capture or pawn move
+    plies = 0
+    while True:
+        moves = gs.get_valid_moves()
+        if gs.checkmate:
+            result, termination = ("0-1" if gs.white_to_move else "1-0"), "checkmate"
+        elif gs.stalemate:
+            result, termination = "1/2-1/2", "stalemate"
+        elif repetitions[gs.zobrist_key] >= 3:
+            result, termination = "1/2-1/2", "threefold repetition"
+        elif halfmove_clock >= 100:
+            result, termination = "1/2-1/2", "fifty-move rule"
+        elif insufficient_material(gs):
+            result, termination = "1/2-1/2", "insufficient material"
+        elif plies >= max_plies:
+            result, termination = "1/2-1/2", "adjudicated after %d plies" % plies
+        else:
+            result = None
+        if result is not None:
+            break
+
+        side = gs.white_to_move
+        searcher = searchers[side]
+        if clocks is not None:
+            increment = time_control[1]
+            searcher.time_limit = max(0.0, min(clocks[side] / MOVES_TO_GO + 0.8 * increment, clocks[side] * 0.5))
+        start = time.perf_counter()
+        move = searcher.search(gs).best_move if len(moves) > 1 else moves[0]
+        if clocks is not None:
+            clocks[side] -= time.perf_counter() - start
+            if clocks[side] < 0:
+                result, termination = ("0-1" if side else "1-0"), "time forfeit"
+                break
+            clocks[side] += increment
+        irreversible = move.piece_moved[1] == "p" or move.piece_captured != "--"
+        gs.make_move(move)
+        plies += 1
+        if irreversible:
+            halfmove_clock = 0
+            repetitions.clear()
+        else:
+            halfmove_clock += 1
+        repetitions[gs.zobrist_key] = repetitions.get(gs.zobrist_key, 0) + 1
+
+    tags = {
+        "Event": "Chess.Tournament",
+        "Round": str(round_number),
+        "Game": str(number),
+        "White": white.name,
+        "Black": black.name,
+        "TimeControl": "%g+%g" % time_control if time_control else "-",
+        "Termination": termination,
+        "PlyCount": str(plies),
+    }
+    game = Pgn.game_from_state(gs, tags, result)
+    return GameResult(number, white.name, black.name, result, termination, game)
+
+
+def schedule(engines, openings, rounds=1):
+    # (number, round, fen, white, black) of every game, each opening twice with the colors swapped in every round
+    first, second = engines
+    number = 0
+    for round_number in range(1, rounds + 1):
+        for fen in openings:
+            for white, black in ((first, second), (second, first)):
+                number += 1
+                yield number, round_number, fen, white, black
+
+
+def play(engines, openings=OPENINGS, rounds=1, workers=None, time_control=None, max_plies=MAX_PLIES):
+    # yields a GameResult per game in completion order; closing the generator cancels the games not started yet
+    workers = workers or os.cpu_count() or 1
+    max_pending = workers * 2
+    games = schedule(engines, openings, rounds)
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        pending = set()
+        try:
+            exhausted = False
+            while pending or not exhausted:
+                while not exhausted and len(pending) < max_pending:
+                    game = next(games, None)
+                    if game is None:
+                        exhausted = True
+                    else:
+                        pending.add(pool.submit(play_game, *game, time_control, max_plies))
+                if not pending:
+                    break
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+class Score:
+    # wins, draws and losses of the first engine, with the Elo and SPRT arithmetic on them
+    def __init__(self):
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+
+    @property
+    def games(self):
+        return self.wins + self.draws + self.losses
+
+    def add(self, result, first_is_white):
+        if result == "1/2-1/2":
+            self.draws += 1
+        elif (result == "1-0") == first_is_white:
+            self.wins += 1
+        else:
+            self.losses += 1
+
+    def mean(self):
+        return (self.wins + 0.5 * self.draws) / self.games if self.games else 0.5
+
+    def variance(self):
+        # variance of the score of a single game
+        if not self.games:
+            return 0.0
+        mean = self.mean()
+        return (
+            self.wins * (1 - mean) ** 2 + self.draws * (0.5 - mean) ** 2 + self.losses * mean ** 2
+        ) / self.games
+
+    def elo(self):
+        return elo_difference(self.mean())
+
+    def elo_error(self):
+        # half the width of the 95% confidence interval of elo(), infinite while every game had the same result
+        if not self.games or self.variance() == 0:
+            return math.inf
+        margin = 1.96 * math.sqrt(self.variance() / self.games)
+        return (elo_difference(self.mean() + margin) - elo_difference(self.mean() - margin)) / 2
+
+    def llr(self, elo0, elo1):
+        # log-likelihood ratio of elo1 against elo0 under the normal approximation of the mean score
+        variance = self.variance()
+        if variance == 0:
+            return 0.0
+        score0, score1 = expected_score(elo0), expected_score(elo1)
+        return (score1 - score0) * (2 * self.mean() - score0 - score1) * self.games / (2 * variance)
+
+    def __str__(self):
+        return "+%d =%d -%d" % (self.wins, self.draws, self.losses)
+
+
+def expected_score(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def elo_difference(score):
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+
+def sprt_bounds(alpha, beta):
+    # the LLR accepts elo0 below the first bound and elo1 above the second
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play two engine configurations against each other.")
+    parser.add_argument("--engine", action="append", required=True, help="name:option=value,... given twice")
+    parser.add_argument("--openings", help="EPD/FEN file of start positions, a built-in suite by default")
+    parser.add_argument("--rounds", type=int, default=1, help="times the opening suite is played (twice each)")
+    parser.add_argument("--tc", help="time control base+increment in seconds, e.g. 10+0.1")
+    parser.add_argument("--max-plies", type=int, default=MAX_PLIES, help="adjudicate a draw after this many plies")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, one per core by default")
+    parser.add_argument("--pgn", help="write every finished game to this PGN file")
+    parser.add_argument("--sprt", nargs=2, type=float, metavar=("ELO0", "ELO1"), help="stop when the SPRT decides")
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    args = parser.parse_args(argv)
+    try:
+        engines = [parse_engine(text) for text in args.engine]
+        time_control = parse_time_control(args.tc) if args.tc else None
+    except ValueError as e:
+        parser.error(str(e))
+    if len(engines) != 2 or engines[0].name == engines[1].name:
+        parser.error("give --engine twice, with two different names")
+    for engine in engines:
+        if time_control is None and "depth" not in engine.options and "nodes" not in engine.options:
+            parser.error("engine %s needs depth or nodes when there is no --tc" % engine.name)
+    openings = [record.fen for record in Epd.read_epd(args.openings)] if args.openings else OPENINGS
+
+    first = engines[0].name
+    score = Score()
+    bounds = sprt_bounds(args.alpha, args.beta) if args.sprt else None
+    decision = None
+    start = time.perf_counter()
+    output = open(args.pgn, "w", encoding="utf-8") if args.pgn else None
+    games = play(engines, openings, args.rounds, args.workers, time_control, args.max_plies)
+    try:
+        for game in games:
+            score.add(game.result, game.white == first)
+            if output is not None:
+                Pgn.write_games([game.game], output)
+                output.write("\n")
+                output.flush()
+            line = "game %d %s-%s %s (%s): %s, elo %.1f +- %.1f" % (
+                game.number,
+                game.white,
+                game.black,
+                game.result,
+                game.termination,
+                score,
+                score.elo(),
+                score.elo_error(),
+            )
+            if bounds is not None:
+                llr = score.llr(*args.sprt)
+                line += ", LLR %.2f [%.2f, %.2f]" % (llr, bounds[0], bounds[1])
+                if llr <= bounds[0]:
+                    decision = "H0 accepted (elo %g)" % args.sprt[0]
+                elif llr >= bounds[1]:
+                    decision = "H1 accepted (elo %g)" % args.sprt[1]
+            print(line, file=sys.stderr)
+            if decision is not None:
+                break
+    finally:
+        games.close()
+        if output is not None:
+            output.close()
+    elapsed = time.perf_counter() - start
+    print(
+        "%s vs %s: %s in %d games, %.1fs, elo %.1f +- %.1f%s"
+        % (
+            first,
+            engines[1].name,
+            score,
+            score.games,
+            elapsed,
+            score.elo(),
+            score.elo_error(),
+            ", SPRT " + (decision or "undecided") if bounds is not None else "",
+        )
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
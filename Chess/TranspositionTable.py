@@ -0,0 +1,123 @@
+"""
+Fixed-size transposition table for the search, keyed by GameState.zobrist_key. All memory is allocated up front in
+two array('Q') columns, one for the full keys and one for the packed entry data, so its size never grows past the
+configured number of megabytes. Entries store depth, score, bound type and best move.
+
+Replacement policies:
+    "depth"  - buckets of two slots, the first keeps the deepest (or most recent search's) entry and the second is
+               always replaced
+    "always" - one slot per index, every store overwrites it
+
+Entry data layout (64 bits): score + SCORE_OFFSET in bits 0-19, depth in bits 20-27, bound in bits 28-29,
+search generation in bits 30-35 and the packed best move in bits 36-63.
+"""
+
+from array import array
+
+EXACT = 1
+LOWER_BOUND = 2  # the score is at least this much (the search failed high)
+UPPER_BOUND = 3  # the score is at most this much (the search failed low)
+POLICIES = ("depth", "always")
+ENTRY_BYTES = 16  # 8 for the key, 8 for the data
+SCORE_OFFSET = 1 << 19
+MAX_DEPTH = 255
+
+
+class TranspositionTable:
+    def __init__(self, size_mb=16, policy="depth"):
+        if policy not in POLICIES:
+            raise ValueError("policy must be one of %s, not %r" % (POLICIES, policy))
+        self.policy = policy
+        # largest power of two number of entries that fits, so the index is a mask of the key
+        entries = max(2, size_mb * 1024 * 1024 // ENTRY_BYTES)
+        self.size = 1 << (entries.bit_length() - 1)
+        self.slots_per_bucket = 2 if policy == "depth" else 1
+        self.index_mask = (self.size // self.slots_per_bucket) - 1
+        self.keys = array("Q", [0]) * self.size
+        self.data = array("Q", [0]) * self.size
+        self.generation = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0  # probed index held a different position
+        self.stores = 0
+        self.replacements = 0  # stores that evicted a different position
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "policy": self.policy,
+            "probes": self.probes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "replacements": self.replacements,
+            "hit_rate": self.hits / self.probes if self.probes else 0.0,
+        }
+
+    def clear(self):
+        self.keys = array("Q", [0]) * self.size
+        self.data = array("Q", [0]) * self.size
+        self.generation = 0
+
+    def new_search(self):
+        # entries from earlier searches stay usable but are the first to be replaced
+        self.generation = (self.generation + 1) & 63
+
+    def probe(self, key):
+        # returns (depth, score, bound, move) for the position, or None
+        self.probes += 1
+        slot = (key & self.index_mask) * self.slots_per_bucket
+        occupied = False
+        for slot in range(slot, slot + self.slots_per_bucket):
+            data = self.data[slot]
+            if data:
+                if self.keys[slot] == key:
+                    self.hits += 1
+                    return (
+                        (data >> 20) & 0xFF,
+                        (data & 0xFFFFF) - SCORE_OFFSET,
+                        (data >> 28) & 3,
+                        data >> 36,
+                    )
+                occupied = True
+        if occupied:
+            self.collisions += 1
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, score, bound, move):
+        # move is a packed move integer (Move.packed), 0 for none
+        self.stores += 1
+        data = (
+            (score + SCORE_OFFSET)
+            | min(depth, MAX_DEPTH) << 20
+            | bound << 28
+            | self.generation << 30
+            | move << 36
+        )
+        slot = (key & self.index_mask) * self.slots_per_bucket
+        if self.slots_per_bucket == 2:
+            stored = self.data[slot]
+            # the depth-preferred slot is kept unless the new entry is the same position, at least as deep,
+            # or the stored one is left over from an earlier search
+            if (
+                stored
+                and self.keys[slot] != key
+                and ((stored >> 20) & 0xFF) > depth
+                and (stored >> 30) & 63 == self.generation
+            ):
+                slot += 1
+        if self.data[slot] and self.keys[slot] != key:
+            self.replacements += 1
+        self.keys[slot] = key
+        self.data[slot] = data
+
+    def hashfull(self):
+        # permille of used slots in the first 1000, as UCI engines report it
+        sample = min(1000, self.size)
+        return sum(1 for i in range(sample) if self.data[i]) * 1000 // sample
@@ -0,0 +1,62 @@
+"""
+Zobrist hashing of a GameState. Every (piece, square) pair, the side to move, each castling right and each en passant
+file gets a fixed random 64-bit number, and the key of a position is the XOR of the numbers that apply to it.
+GameState keeps its key up to date in make_move/undo_move by XORing only what the move changed; compute_key builds
+it from scratch and is what the incremental key is checked against in debug mode.
+"""
+
+import random
+
+from Chess import Bitboard
+
+generator = random.Random(20201028)  # fixed seed, keys must be the same in every process
+PIECE_SQUARE = {piece: tuple(generator.getrandbits(64) for _ in range(64)) for piece in Bitboard.PIECES}
+WHITE_TO_MOVE = generator.getrandbits(64)
+CASTLING = tuple(generator.getrandbits(64) for _ in range(4))  # wks, bks, wqs, bqs
+EN_PASSANT = tuple(generator.getrandbits(64) for _ in range(8))  # by file
+
+
+def state_key(castle_rights, enpassant_possible):
+    key = 0
+    if castle_rights.wks:
+        key ^= CASTLING[0]
+    if castle_rights.bks:
+        key ^= CASTLING[1]
+    if castle_rights.wqs:
+        key ^= CASTLING[2]
+    if castle_rights.bqs:
+        key ^= CASTLING[3]
+    if enpassant_possible:
+        key ^= EN_PASSANT[enpassant_possible[1]]
+    return key
+
+
+def move_key(move, piece_placed):
+    # XOR of every piece-square number the move touches; the same value takes the key forward and back
+    start = move.packed & 63  # the packed move already holds square indexes
+    end = (move.packed >> 6) & 63
+    key = PIECE_SQUARE[move.piece_moved][start] ^ PIECE_SQUARE[piece_placed][end]
+    if move.enpassant_move:
+        key ^= PIECE_SQUARE[move.piece_captured][(start & ~7) | (end & 7)]
+    elif move.piece_captured != "--":
+        key ^= PIECE_SQUARE[move.piece_captured][end]
+    if move.castle:
+        rook = PIECE_SQUARE[move.piece_moved[0] + "R"]
+        if end > start:  # king side castle
+            key ^= rook[end + 1] ^ rook[end - 1]
+        else:  # queen side castle
+            key ^= rook[end - 2] ^ rook[end + 1]
+    return key
+
+
+def compute_key(gs):
+    key = 0
+    sq = 0
+    for row in gs.board:
+        for piece in row:
+            if piece != "--":
+                key ^= PIECE_SQUARE[piece][sq]
+            sq += 1
+    if gs.white_to_move:
+        key ^= WHITE_TO_MOVE
+    return key ^ state_key(gs.current_castling_right, gs.enpassant_possible)